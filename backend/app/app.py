@@ -1,31 +1,55 @@
+import base64
+import json
+import os
+import threading
+import time
 from datetime import datetime
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, g, request, jsonify, send_from_directory
 from flask_swagger_ui import get_swaggerui_blueprint
 from functions.db_functions import (
     get_userID,
-    get_user_last_research_date,
     get_user_providers,
-    modify_user_providers,
     get_user_results,
-    modify_last_research_user,
-    modify_film,
+    get_common_results,
+    get_job,
+    open_user_results,
+    db_session,
+    warm_up_db_pool,
+    RESULT_SORTS,
 )
+from functions.job_functions import enqueue_build, get_job_channel, public_job
+from functions.results_cache import RESULTS_CACHE_SIZE, SORT_KEYS as CACHED_SORTS, get_watchlist_results
 from functions.fetch_functions import (
-    get_ids,
-    get_providers,
-    get_watchlist,
     get_all_regions,
     get_region_providers,
-    sort_watchlist,
     get_genres_id,
 )
+from functions.metrics import REQUEST_SECONDS, render_metrics
+from functions.tracing import configure_logging, new_trace_id
 from flask_cors import CORS
 import logging
 
 app = Flask(__name__, static_folder='static', static_url_path='/static')
 app.config["APPLICATION_ROOT"] = "/api"
 CORS(app)
+configure_logging()
 logger = logging.getLogger(__name__)
+warm_up_db_pool()
+
+# Largest page of /results a client can ask for.
+MAX_RESULTS_LIMIT = 200
+# Seconds between two lines of a results stream while nothing happens.
+STREAM_HEARTBEAT_SECONDS = 10
+# Seconds between two reads of a job built by another backend process.
+STREAM_POLL_SECONDS = 1
+# Results streams must reach the client line by line, through proxies too.
+STREAM_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+# Results streams following a build at the same time in each process, in the
+# threaded server mode: each holds a request thread until its build ends. Beyond
+# that, /results/stream answers 202 and the client polls the job instead.
+WSGI_STREAMS = int(os.getenv("WSGI_STREAMS", str(int(os.getenv("GUNICORN_THREADS", "4")) // 2)))
+
+_stream_slots = threading.BoundedSemaphore(WSGI_STREAMS) if WSGI_STREAMS else None
 
 SWAGGER_URL = "/swagger"
 API_URL = "/static/swagger.json"
@@ -37,6 +61,29 @@ swaggerui_blueprint = get_swaggerui_blueprint(
 )
 app.register_blueprint(swaggerui_blueprint, url_prefix=SWAGGER_URL)
 
+@app.before_request
+def start_trace():
+    g.trace_id = new_trace_id(request.headers.get("X-Request-ID"))
+    g.started = time.perf_counter()
+
+
+@app.after_request
+def finish_trace(response):
+    response.headers["X-Request-ID"] = g.trace_id
+    if not response.is_streamed:
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_SECONDS.labels(endpoint, request.method, str(response.status_code)).observe(
+            time.perf_counter() - g.started
+        )
+    return response
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    data, content_type = render_metrics()
+    return Response(data, content_type=content_type)
+
+
 @app.route("/", methods=["GET"])
 def get_home():
     return jsonify({"message" : "Boum boum, server is running !"})
@@ -85,6 +132,95 @@ def get_genres():
     genres = get_genres_id()
     return {"genres": list(genres.values())}
 
+def needs_build(watchlist_size: int, last_research_date, refresh: bool) -> bool:
+    """
+    Whether the stored watchlist of a user must be rebuilt before answering.
+    """
+    return (
+        not watchlist_size
+        or not last_research_date
+        or (datetime.now() - last_research_date).days > 7
+        or refresh
+    )
+
+
+def queue_build(user_ID: str, username: str, country_code: str, refresh: bool):
+    """
+    Queue a build of the results of a user and return the 202 response to poll it.
+    """
+    # Scraping and enrichment run in the background; the client polls the job
+    logger.info("Queueing results build for user=%s country=%s refresh=%s", username, country_code, refresh)
+    job_id = enqueue_build(user_ID, username, country_code)
+    if job_id is None:
+        return "Error: failed to queue the results build", 500
+    job = get_job(job_id)
+    return jsonify(public_job(job) if job else {"job_id": job_id, "status": "queued"}), 202
+
+
+def encode_cursor(sort: str, film: dict) -> str:
+    """
+    Opaque cursor pointing after film in the results sorted by sort.
+    """
+    value = {"note": film["note"] or 0, "date": film["date"] or 0, "title": film["title"] or ""}[sort]
+    return base64.urlsafe_b64encode(json.dumps([sort, value, film["id"]]).encode()).decode()
+
+
+def decode_cursor(cursor: str, sort: str) -> tuple:
+    """
+    Return the (sort value, film id) key of a cursor. Raises ValueError if the
+    cursor is malformed, holds values of the wrong types or was issued for
+    another sort.
+    """
+    try:
+        cursor_sort, value, film_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError("invalid cursor")
+    if cursor_sort != sort:
+        raise ValueError("cursor does not match sort")
+    # The key is compared to the stored films as it is: a forged one must not reach them
+    value_types = (str,) if sort == "title" else (int, float)
+    if (
+        not isinstance(film_id, int)
+        or isinstance(film_id, bool)
+        or not isinstance(value, value_types)
+        or isinstance(value, bool)
+    ):
+        raise ValueError("invalid cursor")
+    return value, film_id
+
+
+def parse_results_query(data: dict) -> dict:
+    """
+    Read the pagination, sort and filter parameters of /results.
+    Raises ValueError with a message for the client on invalid values.
+    """
+    def number(name, cast):
+        value = data.get(name)
+        if value is None or value == "":
+            return None
+        try:
+            return cast(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"invalid {name}")
+
+    sort = data.get("sort") or "note"
+    if sort not in RESULT_SORTS:
+        raise ValueError(f"sort must be one of {', '.join(RESULT_SORTS)}")
+    limit = number("limit", int)
+    if limit is not None and not 1 <= limit <= MAX_RESULTS_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_RESULTS_LIMIT}")
+    cursor = data.get("cursor")
+    return {
+        "sort": sort,
+        "limit": limit,
+        "after": decode_cursor(cursor, sort) if cursor else None,
+        "genre": data.get("genre") or None,
+        "min_grade": number("min_grade", float),
+        "year_from": number("year_from", int),
+        "year_to": number("year_to", int),
+    }
+
+
 @app.route("/results", methods=["POST"])
 def results():
     logger.info("POST /results started")
@@ -95,52 +231,292 @@ def results():
     selected_providers = data.get("providers", [])
     refresh = data.get("refresh", False)
     dual_mode = data.get("dual_mode", False)
+    job_id = data.get("job_id")
     if not country_code:
         return "Error: country_code parameter is required", 400
     if not username:
         return "Error: username parameter is required", 400
     if country_code not in region_list:
         return "Error: invalid country_code", 400
+    try:
+        query = parse_results_query(data)
+    except ValueError as e:
+        return f"Error: {e}", 400
 
-    user_ID = get_userID(username)
-    if user_ID == -1:
-        return "Error: failed to retrieve user ID", 500
+    job = None
+    if job_id:
+        # Results of a build this client has been waiting for
+        job = get_job(job_id)
+        if not job or job["username"] != username or job["country_code"] != country_code:
+            return "Error: invalid job_id", 400
+        if job["status"] == "failed":
+            return jsonify({"error": job["error"]}), 503
 
-    last_research_date = get_user_last_research_date(user_ID)
-    if last_research_date == -1:
-        return "Error: failed to retrieve the last research date", 500
+    # The user, its providers and its stored results in one query. Availability
+    # is stored for every region, so a region switch is answered from the stored
+    # watchlist as long as it is fresh. Providers, filters, sort and pagination
+    # are applied by the query, or to the cached watchlist when the results cache
+    # is on and the sort is not by title; one extra film tells whether there is
+    # a next page.
+    limit = query.pop("limit")
+    filtered = any(query[name] is not None for name in ("after", "genre", "min_grade", "year_from", "year_to"))
+    cached_results = RESULTS_CACHE_SIZE and query["sort"] in CACHED_SORTS
+    user = open_user_results(
+        username,
+        country_code,
+        selected_providers,
+        sync_providers=not dual_mode,
+        with_results=not cached_results and (not refresh or job is not None),
+        # A visit is its first page; later pages, filters, builds waited for and
+        # the views of a common search are part of it
+        visit=not (job or dual_mode or filtered),
+        limit=limit + 1 if limit else None,
+        **query,
+    )
+    if user is None:
+        return "Error: failed to retrieve the stored results", 500
 
-    if not dual_mode:
-        modify_user_providers(user_ID, country_code, selected_providers)
+    if job is not None:
+        if job["status"] != "done":
+            return jsonify(public_job(job)), 202
+    elif needs_build(user["watchlist_size"], user["last_research"], refresh):
+        return queue_build(user["user_ID"], username, country_code, refresh)
 
-    watchlist = get_user_results(user_ID, country_code)
-    if (
-        not watchlist
-        or not last_research_date
-        or (datetime.now() - last_research_date).days > 7
-        or refresh
-    ):
-        try:
-            logger.info("Building results via live scrape for user=%s country=%s refresh=%s", username, country_code, refresh)
-            watchlist = get_watchlist(username)
-            if watchlist is None:
-                return jsonify({"error": "Failed to retrieve watchlist from Letterboxd."}), 503
-            # If the user has an empty watchlist, that's valid; return empty results.
-            if not watchlist:
-                logger.info("Empty watchlist for user=%s", username)
-                return jsonify([]), 200
-
-            watchlist = get_ids(watchlist)
-            watchlist = get_providers(watchlist)
-            watchlist = sort_watchlist(watchlist, selected_providers)
-            modify_last_research_user(user_ID)
-            modify_film(user_ID, country_code, watchlist)
-        except Exception as e:
-            logger.exception("Failed to build results for %s", username)
-            # Frontend will display this message if available
-            return jsonify({"error": f"Failed to load results: {str(e)}"}), 503
-    elif any(film["providers"] not in selected_providers for film in watchlist):
-        watchlist = sort_watchlist(watchlist, selected_providers)
-
-    logger.info("POST /results finished (count=%s)", len(watchlist) if isinstance(watchlist, list) else "n/a")
+    if cached_results:
+        cached = get_watchlist_results(user["user_ID"], country_code, user["results_version"])
+        if cached is None:
+            return "Error: failed to retrieve the stored results", 500
+        if limit is None and not filtered:
+            # The whole list is serialized once per provider set and sort
+            logger.info("POST /results finished (cached)")
+            return Response(cached.view(selected_providers, query["sort"]).body(), mimetype="application/json")
+        watchlist = cached.select(selected_providers, limit=limit + 1 if limit else None, **query)
+    else:
+        watchlist = user["results"]
+    logger.info("POST /results finished (count=%s)", len(watchlist))
+    if limit is None:
+        return watchlist
+    next_cursor = encode_cursor(query["sort"], watchlist[limit - 1]) if len(watchlist) > limit else None
+    return {"results": watchlist[:limit], "next_cursor": next_cursor}
+
+
+def ndjson(event: dict) -> str:
+    return json.dumps(event) + "\n"
+
+
+def stream_job(job_id: str, selected_providers: list, stored_results=None):
+    """
+    Yield the NDJSON events of a build job: its progress, each film available on
+    the selected providers as soon as the build finds it, then its outcome.
+    Films are only streamed live when the job runs in this process; a job built by
+    another process is followed through its stored progress and, if given,
+    stored_results() is streamed once it is done.
+    """
+    selected = set(selected_providers)
+    count = 0
+    channel = get_job_channel(job_id)
+    if channel is not None:
+        for event in channel.subscribe(STREAM_HEARTBEAT_SECONDS):
+            if event is None:
+                yield ndjson({"type": "heartbeat"})
+            elif event["type"] == "film":
+                providers = [provider for provider in event["film"]["providers"] if provider in selected]
+                if providers:
+                    count += 1
+                    yield ndjson({"type": "film", "film": {**event["film"], "providers": providers}})
+            elif event["type"] == "progress":
+                yield ndjson(event)
+            elif event["type"] == "error":
+                yield ndjson(event)
+                return
+        yield ndjson({"type": "done", "count": count})
+        return
+
+    last_progress = None
+    last_sent = time.monotonic()
+    while True:
+        job = get_job(job_id)
+        if job is None:
+            yield ndjson({"type": "error", "error": "Failed to read the build job"})
+            return
+        if job["status"] == "failed":
+            yield ndjson({"type": "error", "error": job["error"]})
+            return
+        if job["status"] == "done":
+            break
+        progress = {field: job[field] for field in ("stage", "pages_scraped", "films_total", "films_enriched")}
+        if progress != last_progress:
+            yield ndjson({"type": "progress", **progress})
+            last_progress, last_sent = progress, time.monotonic()
+        elif time.monotonic() - last_sent >= STREAM_HEARTBEAT_SECONDS:
+            yield ndjson({"type": "heartbeat"})
+            last_sent = time.monotonic()
+        time.sleep(STREAM_POLL_SECONDS)
+    if stored_results is not None:
+        films = stored_results()
+        if films is None:
+            yield ndjson({"type": "error", "error": "Failed to retrieve the stored results"})
+            return
+        for film in films:
+            count += 1
+            yield ndjson({"type": "film", "film": film})
+    yield ndjson({"type": "done", "count": count})
+
+
+def open_results_stream(data: dict) -> tuple:
+    """
+    Check a /results/stream request and queue the build it needs, if any.
+    Returns (plan, None), or (None, (message, status)) when the request fails.
+    The plan holds the events to send first ("events") and, when "job_id" is set,
+    the build job to follow next ("job", as exposed by the API) with the selected
+    providers ("providers") and the function reading the stored results once it
+    is done ("stored_results").
+    """
+    region_list = get_all_regions()
+    username = data.get("username")
+    country_code = data.get("country_code")
+    selected_providers = data.get("providers", [])
+    refresh = data.get("refresh", False)
+    dual_mode = data.get("dual_mode", False)
+    job_id = data.get("job_id")
+    if not country_code:
+        return None, ("Error: country_code parameter is required", 400)
+    if not username:
+        return None, ("Error: username parameter is required", 400)
+    if country_code not in region_list:
+        return None, ("Error: invalid country_code", 400)
+
+    user = open_user_results(
+        username,
+        country_code,
+        selected_providers,
+        sync_providers=not dual_mode,
+        with_results=not (RESULTS_CACHE_SIZE or job_id or refresh),
+        visit=not (job_id or dual_mode),
+    )
+    if user is None:
+        return None, ("Error: failed to retrieve the user", 500)
+    user_ID = user["user_ID"]
+
+    def stored_results():
+        return get_user_results(user_ID, country_code, selected_providers)
+
+    plan = {"events": [], "job_id": None, "job": None, "providers": selected_providers, "stored_results": None}
+    if job_id:
+        # Follow a build this client was told about; its results are fetched afterwards
+        job = get_job(job_id)
+        if not job or job["username"] != username or job["country_code"] != country_code:
+            return None, ("Error: invalid job_id", 400)
+        plan.update(job_id=job_id, job=public_job(job))
+    elif needs_build(user["watchlist_size"], user["last_research"], refresh):
+        logger.info("Queueing streamed results build for user=%s country=%s refresh=%s", username, country_code, refresh)
+        job_id = enqueue_build(user_ID, username, country_code)
+        if job_id is None:
+            return None, ("Error: failed to queue the results build", 500)
+        job = public_job(get_job(job_id) or {"job_id": job_id, "status": "queued"})
+        plan.update(events=[{"type": "job", **job}], job_id=job_id, job=job, stored_results=stored_results)
+    else:
+        if RESULTS_CACHE_SIZE:
+            cached = get_watchlist_results(user_ID, country_code, user["results_version"])
+            if cached is None:
+                return None, ("Error: failed to retrieve the stored results", 500)
+            films = cached.select(selected_providers)
+        else:
+            films = user["results"]
+        plan["events"] = [*({"type": "film", "film": film} for film in films), {"type": "done", "count": len(films)}]
+    return plan, None
+
+
+@app.route("/results/stream", methods=["POST"])
+def results_stream():
+    logger.info("POST /results/stream started")
+    plan, error = open_results_stream(request.json)
+    if error:
+        return error
+    if plan["job_id"] and (_stream_slots is None or not _stream_slots.acquire(blocking=False)):
+        # Every stream slot is taken: the client polls the build like for /results
+        logger.info("POST /results/stream answered 202, no stream slot left")
+        return jsonify(plan["job"]), 202
+
+    def events():
+        for event in plan["events"]:
+            yield ndjson(event)
+        if plan["job_id"]:
+            yield from stream_job(plan["job_id"], plan["providers"], plan["stored_results"])
+
+    response = Response(
+        events(),
+        mimetype="application/x-ndjson",
+        headers=STREAM_HEADERS,
+    )
+    if plan["job_id"]:
+        response.call_on_close(_stream_slots.release)
+    return response
+
+
+@app.route("/results/common", methods=["POST"])
+@db_session()
+def common_results():
+    logger.info("POST /results/common started")
+    region_list = get_all_regions()
+    data = request.json
+    usernames = list(dict.fromkeys(data.get("usernames") or []))
+    country_code = data.get("country_code")
+    selected_providers = data.get("providers", [])
+    refresh = data.get("refresh", False)
+    job_ids = data.get("job_ids") or []
+    if not country_code:
+        return "Error: country_code parameter is required", 400
+    if len(usernames) < 2:
+        return "Error: at least two usernames are required", 400
+    if country_code not in region_list:
+        return "Error: invalid country_code", 400
+
+    # Builds this client has been waiting for, by username
+    jobs = {}
+    for job_id in job_ids:
+        job = get_job(job_id)
+        if not job or job["username"] not in usernames or job["country_code"] != country_code:
+            return "Error: invalid job_id", 400
+        jobs[job["username"]] = job
+
+    user_IDs = []
+    pending = None
+    for username in usernames:
+        user = open_user_results(
+            username, country_code, selected_providers, sync_providers=False, with_results=False, visit=not job_ids
+        )
+        if user is None:
+            return "Error: failed to retrieve the user", 500
+        user_IDs.append(user["user_ID"])
+
+        job = jobs.get(username)
+        if job:
+            if job["status"] == "failed":
+                return jsonify({"error": job["error"]}), 503
+            if job["status"] != "done":
+                pending = pending or (jsonify(public_job(job)), 202)
+            continue
+        if needs_build(user["watchlist_size"], user["last_research"], refresh):
+            # Every missing build is queued now so that they run side by side
+            response = queue_build(user["user_ID"], username, country_code, refresh)
+            if response[1] != 202:
+                return response
+            pending = pending or response
+    if pending:
+        return pending
+
+    watchlist = get_common_results(user_IDs, country_code, selected_providers)
+    if watchlist is None:
+        return "Error: failed to retrieve the stored results", 500
+
+    logger.info("POST /results/common finished (count=%s)", len(watchlist))
     return watchlist
+
+
+@app.route("/results/jobs/<job_id>", methods=["GET"])
+def get_results_job(job_id):
+    job = get_job(job_id)
+    if not job:
+        return "Error: unknown job_id", 404
+    return public_job(job)
@@ -0,0 +1,201 @@
+"""
+ASGI entry point of the backend (SERVER_MODE=asgi), served by uvicorn workers.
+
+The Flask routes are served as they are, in a pool of ASGI_WSGI_THREADS threads
+per worker, like the threads of a gthread worker. Results streams are
+served natively on the event loop instead, so that a client following a build
+does not hold a thread for minutes; the builds themselves run on the build loop
+of functions/job_functions.py (ASYNC_BUILDS).
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from app.app import (
+    STREAM_HEADERS,
+    STREAM_HEARTBEAT_SECONDS,
+    STREAM_POLL_SECONDS,
+    app as flask_app,
+    ndjson,
+    open_results_stream,
+)
+from functions.db_functions import get_job
+from functions.job_functions import get_job_channel
+from functions.metrics import REQUEST_SECONDS
+from functions.tracing import new_trace_id
+
+logger = logging.getLogger(__name__)
+
+# Threads serving the Flask routes in each worker.
+ASGI_WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", os.getenv("GUNICORN_THREADS", "4")))
+
+_wsgi_executor = ThreadPoolExecutor(max_workers=ASGI_WSGI_THREADS, thread_name_prefix="wsgi")
+
+
+class PooledWsgiToAsgiInstance(WsgiToAsgiInstance):
+    # asgiref runs WSGI apps thread-sensitively, every request of the process on
+    # one shared thread: run them in the pool instead
+    run_wsgi_app = sync_to_async(
+        WsgiToAsgiInstance.__dict__["run_wsgi_app"].func, thread_sensitive=False, executor=_wsgi_executor
+    )
+
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+    """
+    WsgiToAsgi serving the requests concurrently, in the threads of the pool.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await PooledWsgiToAsgiInstance(self.wsgi_application, self.duplicate_header_limit)(scope, receive, send)
+
+
+wsgi_app = PooledWsgiToAsgi(flask_app)
+
+
+async def stream_job_async(job_id: str, selected_providers: list, stored_results=None):
+    """
+    Same as app.stream_job, as an asynchronous generator.
+    """
+    selected = set(selected_providers)
+    count = 0
+    channel = get_job_channel(job_id)
+    if channel is not None:
+        async for event in channel.subscribe_async(STREAM_HEARTBEAT_SECONDS):
+            if event is None:
+                yield ndjson({"type": "heartbeat"})
+            elif event["type"] == "film":
+                providers = [provider for provider in event["film"]["providers"] if provider in selected]
+                if providers:
+                    count += 1
+                    yield ndjson({"type": "film", "film": {**event["film"], "providers": providers}})
+            elif event["type"] == "progress":
+                yield ndjson(event)
+            elif event["type"] == "error":
+                yield ndjson(event)
+                return
+        yield ndjson({"type": "done", "count": count})
+        return
+
+    last_progress = None
+    last_sent = time.monotonic()
+    while True:
+        job = await asyncio.to_thread(get_job, job_id)
+        if job is None:
+            yield ndjson({"type": "error", "error": "Failed to read the build job"})
+            return
+        if job["status"] == "failed":
+            yield ndjson({"type": "error", "error": job["error"]})
+            return
+        if job["status"] == "done":
+            break
+        progress = {field: job[field] for field in ("stage", "pages_scraped", "films_total", "films_enriched")}
+        if progress != last_progress:
+            yield ndjson({"type": "progress", **progress})
+            last_progress, last_sent = progress, time.monotonic()
+        elif time.monotonic() - last_sent >= STREAM_HEARTBEAT_SECONDS:
+            yield ndjson({"type": "heartbeat"})
+            last_sent = time.monotonic()
+        await asyncio.sleep(STREAM_POLL_SECONDS)
+    if stored_results is not None:
+        films = await asyncio.to_thread(stored_results)
+        if films is None:
+            yield ndjson({"type": "error", "error": "Failed to retrieve the stored results"})
+            return
+        for film in films:
+            count += 1
+            yield ndjson({"type": "film", "film": film})
+    yield ndjson({"type": "done", "count": count})
+
+
+async def _read_body(receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return body
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def _start(send, status: int, content_type: str, trace_id: str, headers: dict = None):
+    # Same headers as Flask-CORS and the trace hooks of the Flask app add
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", content_type.encode()),
+            (b"access-control-allow-origin", b"*"),
+            (b"x-request-id", trace_id.encode()),
+            *((name.lower().encode(), value.encode()) for name, value in (headers or {}).items()),
+        ],
+    })
+
+
+async def results_stream(scope, receive, send):
+    """
+    POST /results/stream, see app.results_stream.
+    """
+    started = time.perf_counter()
+    request_headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+    trace_id = new_trace_id(request_headers.get("x-request-id"))
+    logger.info("POST /results/stream started")
+    try:
+        data = json.loads(await _read_body(receive) or b"null")
+    except ValueError:
+        data = None
+    if isinstance(data, dict):
+        plan, error = await asyncio.to_thread(open_results_stream, data)
+    else:
+        plan, error = None, ("Error: a JSON body is required", 400)
+    if error:
+        message, status = error
+        await _start(send, status, "text/html; charset=utf-8", trace_id)
+        await send({"type": "http.response.body", "body": message.encode()})
+        REQUEST_SECONDS.labels("/results/stream", "POST", str(status)).observe(time.perf_counter() - started)
+        return
+
+    disconnected = asyncio.ensure_future(_read_body(receive))
+
+    async def events():
+        for event in plan["events"]:
+            yield ndjson(event)
+        if plan["job_id"]:
+            async for line in stream_job_async(plan["job_id"], plan["providers"], plan["stored_results"]):
+                yield line
+
+    await _start(send, 200, "application/x-ndjson", trace_id, STREAM_HEADERS)
+    try:
+        async for line in events():
+            # A client that went away is not followed until the end of its build
+            if disconnected.done():
+                break
+            await send({"type": "http.response.body", "body": line.encode(), "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        disconnected.cancel()
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            # The database calls of the streams share the threads (and connections) of the routes
+            asyncio.get_running_loop().set_default_executor(_wsgi_executor)
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+    elif scope["type"] == "http" and scope["method"] == "POST" and scope["path"] == "/results/stream":
+        await results_stream(scope, receive, send)
+    else:
+        await wsgi_app(scope, receive, send)
@@ -0,0 +1,89 @@
+"""
+Benchmark of the watchlist writes (modify_film and modify_user_providers).
+
+Runs against the Postgres database configured in the environment, like the
+backend itself, using synthetic films whose ids cannot clash with TMDB ids.
+Run it from the backend directory, before and after a change to compare:
+
+    python -m benchmarks.bench_db_writes --sizes 1000 10000
+"""
+import argparse
+import time
+from functions.db_functions import (
+    get_userID,
+    modify_film,
+    modify_user_providers,
+    db_operation,
+)
+
+FILM_ID_OFFSET = 2_000_000_000
+REGIONS = ("FR", "US", "GB", "DE", "ES")
+
+
+def make_films(size: int, revision: int = 0) -> list:
+    """
+    Build a synthetic enriched watchlist. A higher revision changes the grade of
+    one film in ten and the offers of one film in twenty.
+    """
+    films = []
+    for i in range(size):
+        film = {
+            "key": f"bench film {i}|2000",
+            "id": FILM_ID_OFFSET + i,
+            "title": f"Bench film {i}",
+            "note": round((i % 100) / 10 + (revision if i % 10 == 0 else 0), 1),
+            "date": "2000",
+            "genres": ["Drama", "Comedy"],
+        }
+        if revision == 0 or i % 20 == 0:
+            film["availability"] = {
+                region: {"flatrate": [f"Provider {(i + revision) % 7}"], "rent": ["Provider 9"]}
+                for region in REGIONS
+            }
+        films.append(film)
+    return films
+
+
+@db_operation(commit=True)
+def cleanup(cursor, user_ID: int, size: int):
+    """
+    Remove the benchmark user and its synthetic films.
+    """
+    ids = list(range(FILM_ID_OFFSET, FILM_ID_OFFSET + size))
+    cursor.execute('DELETE FROM "WATCHLIST" WHERE user_id = %s', (user_ID,))
+    cursor.execute('DELETE FROM "PROVIDER" WHERE user_id = %s', (user_ID,))
+    cursor.execute('DELETE FROM "USER" WHERE user_id = %s', (user_ID,))
+    cursor.execute('DELETE FROM "FILM_LOOKUP" WHERE film_id = ANY(%s)', (ids,))
+    cursor.execute('DELETE FROM "FILM_AVAILABILITY" WHERE film_id = ANY(%s)', (ids,))
+    cursor.execute('DELETE FROM "FILM" WHERE film_id = ANY(%s)', (ids,))
+
+
+def timed(func, *args) -> float:
+    start = time.perf_counter()
+    if func(*args) is None:
+        raise RuntimeError(f"{func.__name__} failed, see the error above")
+    return time.perf_counter() - start
+
+
+def run(size: int):
+    user_ID = get_userID(f"__bench_db_writes_{size}")
+    try:
+        initial = timed(modify_film, user_ID, make_films(size))
+        unchanged = timed(modify_film, user_ID, make_films(size))
+        changed = timed(modify_film, user_ID, make_films(size, revision=1))
+        shrunk = timed(modify_film, user_ID, make_films(size)[: size // 2])
+        providers = timed(modify_user_providers, user_ID, "FR", [f"Provider {i}" for i in range(50)])
+    finally:
+        cleanup(user_ID, size)
+    print(
+        f"{size:>6} films | initial {initial:7.3f}s | unchanged {unchanged:7.3f}s | "
+        f"10% changed {changed:7.3f}s | half removed {shrunk:7.3f}s | 50 providers {providers:6.3f}s",
+        flush=True,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    for size in parser.parse_args().sizes:
+        run(size)
@@ -0,0 +1,296 @@
+"""
+Benchmark of the /results pipeline and of each of its stages, offline.
+
+TMDB and Letterboxd are replaced by the local stand-ins of benchmarks/fake_services.py,
+so runs are reproducible and cost no API quota. Postgres is the one configured in
+the environment, like the backend itself; the synthetic users, films and cached
+responses are removed afterwards. Run it from the backend directory:
+
+    python -m benchmarks.bench_pipeline --sizes 10 100 1000 10000
+    python -m benchmarks.bench_pipeline --sizes 1000 --stages enrich results --tmdb-latency 0.05 --tmdb-429-rate 0.02
+
+For each stage and size, it reports the throughput in films per second, the
+p50/p99 latency of one unit of work (a page, a film, a query or a request) and
+the peak Python memory of a separate run traced with tracemalloc.
+"""
+import argparse
+import os
+import statistics
+import time
+import tracemalloc
+from benchmarks.fake_services import FILM_ID_OFFSET, FILMS_PER_PAGE, FakeServices, render_watchlist_page
+
+STAGES = ("scrape", "extract", "enrich", "enrich_cached", "modify_film", "get_user_results", "results", "results_cached")
+COUNTRY_CODE = "FR"
+SELECTED_PROVIDERS = ["Netflix", "Canal+", "Mubi"]
+# Requests of the cached stages per size
+CACHED_REQUESTS = 20
+
+
+def configure(base_url: str, polite: bool):
+    """
+    Point the backend at the stand-ins. Must run before the functions modules are imported.
+    """
+    os.environ["TMDB_API_URL"] = f"{base_url}/3"
+    os.environ["LETTERBOXD_URL"] = base_url
+    os.environ.setdefault("TMDB_TOKEN", "benchmark")
+    if not polite:
+        # Measure the code rather than the politeness limits
+        os.environ["TMDB_RATE_LIMIT"] = "100000"
+        os.environ["TMDB_BURST"] = "1000"
+        os.environ["LETTERBOXD_PAGES_PER_SECOND"] = "100000"
+        os.environ["LETTERBOXD_BURST"] = "1000"
+
+
+def username(size: int) -> str:
+    return f"__bench_{size}"
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def timed_call(latencies: list, func, *args, **kwargs):
+    start = time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        latencies.append(time.perf_counter() - start)
+
+
+def peak_memory(func) -> int:
+    """
+    Peak Python memory allocated while running func, in bytes.
+    """
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+class Pipeline:
+    """
+    The stages of the pipeline for one watchlist size. Each stage runs once and
+    returns the number of films processed and the latencies of its units of work.
+    """
+
+    def __init__(self, size: int, services: FakeServices):
+        from functions.db_functions import get_userID
+
+        self.size = size
+        self.services = services
+        self.username = username(size)
+        self.user_ID = get_userID(self.username)
+        self.watchlist = None
+        self.enriched = None
+
+    def clear_caches(self):
+        from functions.cache_functions import memory_cache
+
+        memory_cache.clear()
+        delete_cached_responses(self.services.base_url)
+
+    def scrape(self):
+        from functions.fetch_functions import get_watchlist
+
+        latencies = []
+        last = [time.perf_counter()]
+
+        def progress(pages):
+            now = time.perf_counter()
+            latencies.append(now - last[0])
+            last[0] = now
+
+        self.watchlist = get_watchlist(self.username, progress)
+        return len(self.watchlist), latencies
+
+    def extract(self):
+        from playwright.sync_api import sync_playwright
+        from functions.fetch_functions import extract_films
+
+        latencies = []
+        watchlist = []
+        page_count = max(1, -(-self.size // FILMS_PER_PAGE))
+        with sync_playwright() as playwright:
+            browser = playwright.chromium.launch(headless=True)
+            try:
+                page = browser.new_page()
+                for page_number in range(1, page_count + 1):
+                    page.set_content(render_watchlist_page(self.username, self.size, page_number))
+                    timed_call(latencies, extract_films, page, watchlist)
+            finally:
+                browser.close()
+        return len(watchlist), latencies
+
+    def enrich(self):
+        from functions.fetch_functions import _enrich_film, _iter_bounded, get_genres_id
+
+        if self.watchlist is None:
+            self.scrape()
+        latencies = []
+        films = [dict(film) for film in self.watchlist]
+        genres = get_genres_id()
+        self.enriched = list(
+            _iter_bounded(lambda film: timed_call(latencies, _enrich_film, film, COUNTRY_CODE, genres), films)
+        )
+        return len(self.enriched), latencies
+
+    def modify_film(self):
+        from functions.build_functions import film_lookup_key
+        from functions.db_functions import modify_film
+
+        if self.enriched is None:
+            self.enrich()
+        films = [dict(film, key=film_lookup_key(film)) for film in self.enriched]
+        latencies = []
+        if timed_call(latencies, modify_film, self.user_ID, films) is None:
+            raise RuntimeError("modify_film failed, see the error above")
+        return len(films), latencies
+
+    def get_user_results(self):
+        from functions.db_functions import get_user_results
+
+        if self.enriched is None:
+            self.modify_film()
+        latencies = []
+        films = 0
+        for _ in range(CACHED_REQUESTS):
+            results = timed_call(latencies, get_user_results, self.user_ID, COUNTRY_CODE, SELECTED_PROVIDERS)
+            if results is None:
+                raise RuntimeError("get_user_results failed, see the error above")
+            films += len(results)
+        return films, latencies
+
+    def results(self):
+        """
+        A first visit: the request that queues the build, the polling until it is
+        done and the request that reads the results.
+        """
+        from app.app import app
+        from functions.job_functions import get_job
+
+        latencies = []
+        body = {"username": self.username, "country_code": COUNTRY_CODE, "providers": SELECTED_PROVIDERS}
+        client = app.test_client()
+        start = time.perf_counter()
+        response = client.post("/results", json=body)
+        if response.status_code == 202:
+            job_id = response.get_json()["job_id"]
+            while (job := get_job(job_id)) and job["status"] not in ("done", "failed"):
+                time.sleep(0.05)
+            response = client.post("/results", json=dict(body, job_id=job_id))
+        if response.status_code != 200:
+            raise RuntimeError(f"/results returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        latencies.append(time.perf_counter() - start)
+        return self.size, latencies
+
+    def results_cached(self):
+        from app.app import app
+
+        body = {"username": self.username, "country_code": COUNTRY_CODE, "providers": SELECTED_PROVIDERS}
+        client = app.test_client()
+        latencies = []
+        for _ in range(CACHED_REQUESTS):
+            response = timed_call(latencies, client.post, "/results", json=body)
+            if response.status_code != 200:
+                raise RuntimeError(f"/results returned {response.status_code}")
+        return self.size * CACHED_REQUESTS, latencies
+
+    def run(self, stage: str):
+        """
+        Run a stage from the state it expects: cold caches for the uncached stages,
+        no stored watchlist before a first visit.
+        """
+        if stage in ("scrape", "extract", "enrich", "results"):
+            self.clear_caches()
+        if stage == "results":
+            cleanup(self.user_ID, self.username, self.size)
+            from functions.db_functions import get_userID
+
+            self.user_ID = get_userID(self.username)
+        if stage == "enrich_cached":
+            return self.enrich()
+        return getattr(self, stage)()
+
+
+def delete_cached_responses(base_url: str):
+    from functions.db_functions import db_operation
+
+    @db_operation(commit=True)
+    def delete(cursor):
+        cursor.execute('DELETE FROM "TMDB_CACHE" WHERE url LIKE %s', (f"{base_url}/%",))
+        return True
+
+    return delete()
+
+
+def cleanup(user_ID: int, name: str, size: int):
+    """
+    Remove the benchmark user, its jobs and its synthetic films.
+    """
+    from functions.db_functions import db_operation
+
+    @db_operation(commit=True)
+    def delete(cursor):
+        ids = list(range(FILM_ID_OFFSET, FILM_ID_OFFSET + size))
+        cursor.execute('DELETE FROM "JOB" WHERE username = %s', (name,))
+        cursor.execute('DELETE FROM "WATCHLIST" WHERE user_id = %s', (user_ID,))
+        cursor.execute('DELETE FROM "PROVIDER" WHERE user_id = %s', (user_ID,))
+        cursor.execute('DELETE FROM "USER" WHERE user_id = %s', (user_ID,))
+        cursor.execute('DELETE FROM "FILM_LOOKUP" WHERE film_id = ANY(%s)', (ids,))
+        cursor.execute('DELETE FROM "FILM_AVAILABILITY" WHERE film_id = ANY(%s)', (ids,))
+        cursor.execute('DELETE FROM "FILM" WHERE film_id = ANY(%s)', (ids,))
+        return True
+
+    return delete()
+
+
+def run(size: int, stages: list, services: FakeServices, memory: bool):
+    pipeline = Pipeline(size, services)
+    try:
+        for stage in stages:
+            try:
+                start = time.perf_counter()
+                films, latencies = pipeline.run(stage)
+                elapsed = time.perf_counter() - start
+                peak = peak_memory(lambda: pipeline.run(stage)) if memory else None
+            except Exception as e:
+                print(f"{size:>6} films | {stage:<16} | skipped: {str(e)[:120]}", flush=True)
+                continue
+            print(
+                f"{size:>6} films | {stage:<16} | {films / elapsed:9.1f} films/s | "
+                f"p50 {statistics.median(latencies) * 1000:9.2f}ms | p99 {percentile(latencies, 0.99) * 1000:9.2f}ms"
+                + (f" | peak {peak / 2**20:7.1f}MiB" if peak is not None else ""),
+                flush=True,
+            )
+    finally:
+        pipeline.clear_caches()
+        cleanup(pipeline.user_ID, pipeline.username, size)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--tmdb-latency", type=float, default=0.0, help="seconds added to every TMDB response")
+    parser.add_argument("--tmdb-429-rate", type=float, default=0.0, help="share of TMDB requests answered 429")
+    parser.add_argument("--letterboxd-latency", type=float, default=0.0, help="seconds added to every page")
+    parser.add_argument("--polite", action="store_true", help="keep the TMDB and Letterboxd rate limits")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc runs")
+    args = parser.parse_args()
+
+    services = FakeServices(
+        tmdb_latency=args.tmdb_latency,
+        tmdb_429_rate=args.tmdb_429_rate,
+        letterboxd_latency=args.letterboxd_latency,
+    ).start()
+    configure(services.base_url, args.polite)
+    try:
+        for size in args.sizes:
+            run(size, args.stages, services, not args.no_memory)
+        print(f"TMDB stand-in: {services.tmdb_requests} requests, {services.tmdb_throttled} answered 429", flush=True)
+    finally:
+        services.stop()
@@ -0,0 +1,207 @@
+"""
+Local stand-ins of the TMDB API and of Letterboxd watchlist pages, for the benchmarks.
+
+The fake Letterboxd serves the watchlist of "__bench_<N>" users, holding N synthetic
+films, rendered from the fixtures in benchmarks/fixtures/. The fake TMDB answers
+the search, watch/providers, regions and genres endpoints for those films, with
+a configurable latency and a share of 429 responses carrying Retry-After.
+"""
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from string import Template
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+PAGE_TEMPLATE = Template(open(os.path.join(FIXTURES, "watchlist_page.html"), encoding="utf-8").read())
+POSTER_TEMPLATE = Template(open(os.path.join(FIXTURES, "poster.html"), encoding="utf-8").read())
+
+# Letterboxd shows 28 posters per watchlist page
+FILMS_PER_PAGE = 28
+# TMDB ids of the synthetic films, far above the real ones
+FILM_ID_OFFSET = 2_100_000_000
+REGIONS = ("FR", "US", "GB", "DE", "ES")
+PROVIDERS = ("Netflix", "Canal+", "Disney Plus", "Amazon Prime Video", "Apple TV Plus", "Max", "Mubi")
+GENRES = {28: "Action", 35: "Comedy", 18: "Drama", 27: "Horror", 878: "Science Fiction", 99: "Documentary"}
+BENCH_USER = re.compile(r"^/(__bench_(\d+))/watchlist/(?:page/(\d+)/)?$")
+SEARCH_TITLE = re.compile(r"^Bench film (\d+)$")
+
+
+def film_title(index: int) -> str:
+    return f"Bench film {index}"
+
+
+def film_year(index: int) -> int:
+    return 1950 + index % 75
+
+
+def film_providers(index: int) -> dict:
+    """
+    Offers of a synthetic film: none for one film in four, else a few providers per region.
+    """
+    if index % 4 == 3:
+        return {}
+    return {
+        region: {
+            "flatrate": [{"provider_name": PROVIDERS[(index + shift) % len(PROVIDERS)]} for shift in range(1 + index % 3)],
+            "rent": [{"provider_name": "Apple TV"}],
+        }
+        for region in REGIONS[: 1 + index % len(REGIONS)]
+    }
+
+
+def render_watchlist_page(username: str, size: int, page_number: int) -> str | None:
+    """
+    Render page page_number of the watchlist of a user holding size films, or
+    None if there is no such page.
+    """
+    page_count = max(1, -(-size // FILMS_PER_PAGE))
+    if not 1 <= page_number <= page_count:
+        return None
+    first = (page_number - 1) * FILMS_PER_PAGE
+    return render_posters_page(username, range(first, min(size, first + FILMS_PER_PAGE)), page_count)
+
+
+def render_posters_page(username: str, indexes, page_count: int = 1) -> str:
+    posters = "".join(
+        POSTER_TEMPLATE.substitute(
+            title=film_title(index),
+            year=film_year(index),
+            slug=f"bench-film-{index}",
+            film_id=FILM_ID_OFFSET + index,
+        )
+        for index in indexes
+    )
+    pagination = "".join(
+        f'<li class="paginate-page"><a href="/{username}/watchlist/page/{number}/">{number}</a></li>\n'
+        for number in range(1, page_count + 1)
+    )
+    return PAGE_TEMPLATE.substitute(username=username, posters=posters, pagination=pagination)
+
+
+class FakeServices:
+    """
+    Serves the fake TMDB API under /3/ and the fake Letterboxd everywhere else,
+    from a background thread.
+    """
+
+    def __init__(self, tmdb_latency: float = 0.0, tmdb_429_rate: float = 0.0, retry_after: int = 1,
+                 letterboxd_latency: float = 0.0):
+        self.tmdb_latency = tmdb_latency
+        self.tmdb_429_rate = tmdb_429_rate
+        self.retry_after = retry_after
+        self.letterboxd_latency = letterboxd_latency
+        self.tmdb_requests = 0
+        self.tmdb_throttled = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-services", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        services = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path.startswith("/3/"):
+                    services._serve_tmdb(self, url.path[2:], parse_qs(url.query))
+                else:
+                    services._serve_letterboxd(self, url.path)
+
+        return Handler
+
+    def _send(self, handler, status: int, body: str, content_type: str, headers: dict = None):
+        data = body.encode()
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def _serve_letterboxd(self, handler, path: str):
+        time.sleep(self.letterboxd_latency)
+        match = BENCH_USER.match(path)
+        page = None
+        if match:
+            page = render_watchlist_page(match.group(1), int(match.group(2)), int(match.group(3) or 1))
+        if page is None:
+            self._send(handler, 404, "Not found", "text/html; charset=utf-8")
+        else:
+            self._send(handler, 200, page, "text/html; charset=utf-8")
+
+    def _serve_tmdb(self, handler, path: str, query: dict):
+        time.sleep(self.tmdb_latency)
+        with self._lock:
+            self.tmdb_requests += 1
+            throttled = random.random() < self.tmdb_429_rate
+            self.tmdb_throttled += throttled
+        if throttled:
+            self._send(handler, 429, json.dumps({"status_code": 25}), "application/json",
+                       {"Retry-After": str(self.retry_after)})
+            return
+        payload = self._tmdb_payload(path, query)
+        if payload is None:
+            self._send(handler, 404, json.dumps({"status_code": 34}), "application/json")
+        else:
+            self._send(handler, 200, json.dumps(payload), "application/json")
+
+    def _tmdb_payload(self, path: str, query: dict) -> dict | None:
+        if path == "/search/movie":
+            match = SEARCH_TITLE.match(query.get("query", [""])[0])
+            if not match:
+                return {"page": 1, "results": [], "total_results": 0}
+            index = int(match.group(1))
+            return {
+                "page": 1,
+                "results": [
+                    {
+                        "id": FILM_ID_OFFSET + index,
+                        "title": film_title(index),
+                        "vote_average": round(4 + (index * 37 % 60) / 10, 3),
+                        "release_date": f"{film_year(index)}-01-01",
+                        "genre_ids": list(GENRES)[index % 3: index % 3 + 2],
+                    }
+                ],
+                "total_results": 1,
+            }
+        match = re.match(r"^/movie/(\d+)/watch/providers$", path)
+        if match:
+            film_id = int(match.group(1))
+            return {"id": film_id, "results": film_providers(film_id - FILM_ID_OFFSET)}
+        if path == "/watch/providers/regions":
+            return {"results": [{"iso_3166_1": region, "english_name": region} for region in REGIONS]}
+        if path == "/watch/providers/movie":
+            region = query.get("watch_region", [""])[0]
+            return {
+                "results": [
+                    {"provider_name": name, "display_priorities": {region: priority}}
+                    for priority, name in enumerate(PROVIDERS)
+                ]
+            }
+        if path == "/genre/movie/list":
+            return {"genres": [{"id": genre_id, "name": name} for genre_id, name in GENRES.items()]}
+        return None
@@ -0,0 +1,135 @@
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from playwright.sync_api import sync_playwright
+from functions.metrics import BROWSER_LIFETIME_SECONDS, BROWSER_PAGES
+
+
+class BrowserSlot:
+    """
+    A Chromium browser owned by a dedicated thread.
+    Playwright's sync API objects can only be used from the thread that created
+    them, so everything touching this browser runs on the slot's thread.
+    """
+
+    def __init__(self, index: int, max_pages: int, launch_args: list, new_context):
+        self.index = index
+        self.max_pages = max_pages
+        self.launch_args = launch_args
+        self.new_context = new_context
+        self.pages_loaded = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"browser-{index}")
+        self._playwright = None
+        self._browser = None
+        self._launched_at = None
+
+    def run(self, func):
+        """
+        Run func(context) on this browser in a fresh context and return its result.
+        """
+        return self._executor.submit(self._run, func).result()
+
+    def close(self):
+        try:
+            self._executor.submit(self._close_browser).result(timeout=30)
+        except Exception:
+            pass
+        self._executor.shutdown(wait=False)
+
+    def _run(self, func):
+        if self._browser is None:
+            self._launch_browser()
+        context = self.new_context(self._browser)
+        context.on("page", lambda page: page.on("domcontentloaded", self._count_page))
+        try:
+            return func(context)
+        finally:
+            try:
+                context.close()
+            except Exception:
+                pass
+            if self.pages_loaded >= self.max_pages or not self._is_connected():
+                print(f"♻️ Recycling browser {self.index} after {self.pages_loaded} pages", flush=True)
+                self._close_browser()
+
+    def _count_page(self, _page):
+        self.pages_loaded += 1
+
+    def _is_connected(self) -> bool:
+        try:
+            return self._browser.is_connected()
+        except Exception:
+            return False
+
+    def _launch_browser(self):
+        self._playwright = sync_playwright().start()
+        try:
+            self._browser = self._playwright.chromium.launch(headless=True, args=self.launch_args)
+        except Exception:
+            self._close_browser()
+            raise
+        self.pages_loaded = 0
+        self._launched_at = time.monotonic()
+
+    def _close_browser(self):
+        if self._launched_at is not None:
+            BROWSER_LIFETIME_SECONDS.observe(time.monotonic() - self._launched_at)
+            BROWSER_PAGES.observe(self.pages_loaded)
+            self._launched_at = None
+        for resource, close in ((self._browser, "close"), (self._playwright, "stop")):
+            try:
+                if resource is not None:
+                    getattr(resource, close)()
+            except Exception:
+                pass
+        self._browser = None
+        self._playwright = None
+
+
+class BrowserPool:
+    """
+    Fixed-size pool of long-lived Chromium browsers.
+    Each lease gets a fresh isolated context; browsers are recycled after
+    max_pages page loads or when they crash. Leases wait for a free browser, which
+    bounds the number of concurrent scrapes and the memory they use.
+    """
+
+    def __init__(self, size: int, max_pages: int, launch_args: list, new_context):
+        self.size = size
+        self.max_pages = max_pages
+        self.launch_args = launch_args
+        self.new_context = new_context
+        self._slots = None
+        self._lock = threading.Lock()
+
+    def _get_slots(self) -> queue.Queue:
+        # Created on first use so that each gunicorn worker gets its own browsers
+        with self._lock:
+            if self._slots is None:
+                self._slots = queue.Queue()
+                for index in range(self.size):
+                    self._slots.put(BrowserSlot(index, self.max_pages, self.launch_args, self.new_context))
+                atexit.register(self.close)
+            return self._slots
+
+    def run(self, func):
+        """
+        Run func(context) in a fresh context of a pooled browser and return its result.
+        """
+        slots = self._get_slots()
+        slot = slots.get()
+        try:
+            return slot.run(func)
+        finally:
+            slots.put(slot)
+
+    def close(self):
+        if self._slots is None:
+            return
+        while True:
+            try:
+                self._slots.get_nowait().close()
+            except queue.Empty:
+                break
@@ -0,0 +1,190 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from functions.db_functions import get_catalog_entries, get_watchlist_keys, modify_film
+from functions.fetch_functions import enrich_films, enrich_films_async, get_watchlist, get_watchlist_async
+from functions.metrics import BUILD_SECONDS, STAGE_SECONDS, timed
+
+# Providers checked more recently than this are reused from the shared catalog.
+PROVIDERS_MAX_AGE = timedelta(days=int(os.getenv("PROVIDERS_MAX_AGE_DAYS", "7")))
+# Maximum number of stale films whose providers are re-checked per build, oldest first
+# (0 means no limit). Films whose providers were never checked are always checked.
+PROVIDERS_RECHECK_LIMIT = int(os.getenv("PROVIDERS_RECHECK_LIMIT", "100"))
+
+PUBLIC_FIELDS = ("id", "title", "note", "providers", "date", "genres")
+
+
+def film_lookup_key(film: dict) -> str:
+    """
+    Key identifying a scraped Letterboxd film in the shared catalog: its Letterboxd
+    slug when the scraper found one, else its title and year.
+    """
+    if film.get("slug"):
+        return film["slug"]
+    return f'{film["title"].strip().lower()}|{film.get("date", "")}'
+
+
+def build_watchlist(user_ID: str, username: str, country_code: str, progress=None, on_film=None) -> list | None:
+    """
+    Scrape the Letterboxd watchlist of a user and refresh it incrementally.
+    The scraped films are diffed against the stored watchlist: TMDB is only searched
+    for films the shared catalog does not know yet, providers are only re-checked
+    for films whose offers are stale, and removed films are dropped.
+    Returns the films available in the country sorted by note, or None if the
+    watchlist could not be retrieved. An empty scrape leaves the stored watchlist
+    untouched.
+    If given, progress is called with keyword arguments describing the current
+    stage (scraping, providers, saving) and its counters, and on_film is called
+    with each film available in the country as soon as its providers are known:
+    catalog films first, then films as their TMDB search and offers complete.
+    """
+    report = progress or (lambda **fields: None)
+    results = {}
+    started = time.perf_counter()
+
+    def publish(film: dict):
+        if film.get("providers") and film["id"] not in results:
+            results[film["id"]] = {field: film.get(field) for field in PUBLIC_FIELDS}
+            if on_film is not None:
+                on_film(results[film["id"]])
+
+    report(stage="scraping")
+    with timed(BUILD_SECONDS, "scraping"):
+        watchlist = get_watchlist(username, lambda pages: report(pages_scraped=pages))
+    if not watchlist:
+        return watchlist
+    refresh = _plan_refresh(user_ID, country_code, watchlist)
+
+    # Films whose stored offers are still used go out right away
+    for entry in refresh["current"]:
+        publish(entry)
+
+    report(stage="providers", films_total=len(refresh["to_check"]), films_enriched=0)
+    with timed(BUILD_SECONDS, "providers"):
+        for count, film in enumerate(enrich_films(refresh["to_check"], country_code), 1):
+            report(films_enriched=count)
+            if "id" in film:
+                publish(film)
+
+    report(stage="saving")
+    _save_refresh(user_ID, username, refresh)
+    return _sorted_results(results, started)
+
+
+async def build_watchlist_async(user_ID: str, username: str, country_code: str, progress=None, on_film=None) -> list | None:
+    """
+    Same as build_watchlist, for coroutines. The database calls and progress run
+    in worker threads, so that many builds can share one event loop.
+    """
+    results = {}
+    started = time.perf_counter()
+
+    async def report(**fields):
+        if progress is not None:
+            await asyncio.to_thread(progress, **fields)
+
+    def publish(film: dict):
+        if film.get("providers") and film["id"] not in results:
+            results[film["id"]] = {field: film.get(field) for field in PUBLIC_FIELDS}
+            if on_film is not None:
+                on_film(results[film["id"]])
+
+    await report(stage="scraping")
+    with timed(BUILD_SECONDS, "scraping"):
+        watchlist = await get_watchlist_async(username, progress and (lambda pages: progress(pages_scraped=pages)))
+    if not watchlist:
+        return watchlist
+    refresh = await asyncio.to_thread(_plan_refresh, user_ID, country_code, watchlist)
+
+    for entry in refresh["current"]:
+        publish(entry)
+
+    await report(stage="providers", films_total=len(refresh["to_check"]), films_enriched=0)
+    with timed(BUILD_SECONDS, "providers"):
+        count = 0
+        async for film in enrich_films_async(refresh["to_check"], country_code):
+            count += 1
+            await report(films_enriched=count)
+            if "id" in film:
+                publish(film)
+
+    await report(stage="saving")
+    await asyncio.to_thread(_save_refresh, user_ID, username, refresh)
+    return _sorted_results(results, started)
+
+
+def _plan_refresh(user_ID: str, country_code: str, watchlist: list) -> dict:
+    """
+    Diff the scraped films against the stored watchlist and the shared catalog.
+    Returns the lookup keys of the watchlist ("keys") and the stored ones
+    ("stored_keys"), the catalog entries whose offers are reused ("current"),
+    the films unknown to the catalog ("unknown"), the number of catalog films
+    whose offers are re-checked ("rechecked") and every film to enrich ("to_check").
+    """
+    for film in watchlist:
+        film["key"] = film_lookup_key(film)
+    keys = list(dict.fromkeys(film["key"] for film in watchlist))
+
+    stored_keys = get_watchlist_keys(user_ID)
+    catalog = get_catalog_entries(keys, country_code)
+    if stored_keys is None or catalog is None:
+        raise Exception("Failed to read the stored watchlist")
+
+    # Films unknown to the catalog are searched on TMDB
+    unknown = [film for film in watchlist if film["key"] not in catalog]
+
+    now = datetime.now()
+    current = []
+    unchecked = []
+    stale = []
+    for film in watchlist:
+        entry = catalog.get(film["key"])
+        if entry is None:
+            continue
+        entry["key"] = film["key"]
+        checked_at = entry["providers_updated_at"]
+        if checked_at is None:
+            unchecked.append(entry)
+        elif now - checked_at > PROVIDERS_MAX_AGE:
+            stale.append(entry)
+        else:
+            current.append(entry)
+
+    stale.sort(key=lambda entry: entry["providers_updated_at"])
+    if PROVIDERS_RECHECK_LIMIT:
+        current.extend(stale[PROVIDERS_RECHECK_LIMIT:])
+        stale = stale[:PROVIDERS_RECHECK_LIMIT]
+
+    return {
+        "keys": keys,
+        "stored_keys": set(stored_keys),
+        "current": current,
+        "unknown": unknown,
+        "rechecked": len(unchecked) + len(stale),
+        # One watch/providers response covers every region. Catalog films come
+        # first as they only need that call.
+        "to_check": unchecked + stale + unknown,
+    }
+
+
+def _save_refresh(user_ID: str, username: str, refresh: dict):
+    keys, stored_keys = refresh["keys"], refresh["stored_keys"]
+    added = len([key for key in keys if key not in stored_keys])
+    removed = len(stored_keys.difference(keys))
+    print(
+        f"Refresh of {username}: {added} added, {removed} removed, "
+        f"{len(refresh['unknown'])} searched, {refresh['rechecked']} providers re-checked",
+        flush=True,
+    )
+    if refresh["unknown"] or refresh["to_check"] or added or removed:
+        with timed(BUILD_SECONDS, "saving"):
+            if modify_film(user_ID, refresh["to_check"], keys) is None:
+                raise Exception("Failed to save the watchlist")
+
+
+def _sorted_results(results: dict, started: float) -> list:
+    with timed(STAGE_SECONDS, "sort"):
+        films = sorted(results.values(), key=lambda x: x.get("note", 0) or 0, reverse=True)
+    BUILD_SECONDS.labels("total").observe(time.perf_counter() - started)
+    return films
@@ -0,0 +1,90 @@
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functions.db_functions import (
+    get_cached_response,
+    set_cached_response,
+    purge_cached_responses,
+)
+from functions.metrics import CACHE_LOOKUPS
+
+# Number of responses kept in the in-process LRU (per gunicorn worker).
+TMDB_CACHE_SIZE = int(os.getenv("TMDB_CACHE_SIZE", "4096"))
+# Expired rows are purged from the shared store at most once per interval.
+PURGE_INTERVAL = timedelta(hours=1)
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU cache whose entries carry an expiration date.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= datetime.now():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, expires_at: datetime):
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+memory_cache = LRUCache(TMDB_CACHE_SIZE)
+_last_purge = datetime.now()
+_purge_lock = threading.Lock()
+
+
+def get_cached(key: str):
+    """
+    Return the cached value for key, looking in memory first and then in the
+    shared Postgres store. Returns None on a miss.
+    """
+    value = memory_cache.get(key)
+    if value is not None:
+        CACHE_LOOKUPS.labels("memory", "hit").inc()
+        return value
+    CACHE_LOOKUPS.labels("memory", "miss").inc()
+    stored = get_cached_response(key)
+    if stored is None:
+        CACHE_LOOKUPS.labels("postgres", "miss").inc()
+        return None
+    CACHE_LOOKUPS.labels("postgres", "hit").inc()
+    value, expires_at = stored
+    memory_cache.set(key, value, expires_at)
+    return value
+
+
+def set_cached(key: str, value, ttl: int):
+    """
+    Store value for ttl seconds in memory and in the shared Postgres store.
+    """
+    global _last_purge
+    expires_at = datetime.now() + timedelta(seconds=ttl)
+    memory_cache.set(key, value, expires_at)
+    set_cached_response(key, value, expires_at)
+
+    with _purge_lock:
+        if datetime.now() - _last_purge < PURGE_INTERVAL:
+            return
+        _last_purge = datetime.now()
+    purge_cached_responses()
@@ -1,10 +1,15 @@
 import psycopg2
 from psycopg2 import pool
+from psycopg2.extras import execute_values
+import asyncio
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 import contextlib
+import threading
+import time
 import os
 from dotenv import load_dotenv
+from functions.metrics import DB_POOL_IN_USE, DB_POOL_WAIT_SECONDS, STAGE_SECONDS, timed
 # Try to load from repo-root .env.local first, then .env, then backend/.env
 repo_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
 root_env_local = os.path.join(repo_root, ".env.local")
@@ -37,34 +42,97 @@ if missing_vars:
     print(f"Missing database environment variables: {', '.join(missing_vars)}")
     print("Please set them in your .env file or container environment.")
 
+# Nombre de lignes envoyées par requête lors des écritures par lots
+BULK_PAGE_SIZE = 1000
+
+# Threads de requête de chaque processus : ceux du worker gthread, ou en mode
+# asgi ceux qui servent les routes Flask (voir app/asgi.py).
+REQUEST_THREADS = int(
+    os.getenv("ASGI_WSGI_THREADS", os.getenv("GUNICORN_THREADS", "4"))
+    if os.getenv("SERVER_MODE") == "asgi"
+    else os.getenv("GUNICORN_THREADS", "4")
+)
+# Connexions utilisées par les constructions : deux par construction en cours
+# (JOB_WORKERS), pour ses requêtes et celles du cache TMDB, ou avec
+# ASYNC_BUILDS une par thread de la boucle des constructions (ASYNC_BUILD_THREADS),
+# qui exécutent tous leurs appels à la base.
+BUILD_CONNECTIONS = (
+    int(os.getenv("ASYNC_BUILD_THREADS", "8"))
+    if os.getenv("ASYNC_BUILDS", "1" if os.getenv("SERVER_MODE") == "asgi" else "0") == "1"
+    else 2 * int(os.getenv("JOB_WORKERS", "2"))
+)
+# Taille du pool de connexions de chaque processus : une par thread de requête
+# et celles des constructions. Au-delà, les appels attendent une connexion
+# libre au plus DB_POOL_TIMEOUT secondes.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", str(REQUEST_THREADS + BUILD_CONNECTIONS)))
+# Connexions ouvertes dès le démarrage du processus (voir warm_up_db_pool)
+DB_POOL_MIN = min(DB_POOL_SIZE, int(os.getenv("DB_POOL_MIN", str(REQUEST_THREADS))))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+
+CONNECTION_PARAMETERS = {
+    "host": POSTGRES_HOST,
+    "database": POSTGRES_DB,
+    "user": POSTGRES_USER,
+    "password": POSTGRES_PASSWORD,
+    "port": POSTGRES_PORT,
+}
+
 connection_pool = None
+_pool_lock = threading.Lock()
+# Une place par connexion du pool : getconn n'est appelé qu'avec une place libre
+_pool_slots = threading.BoundedSemaphore(DB_POOL_SIZE)
+# Connexion et transaction partagées par les appels d'une requête (voir db_session)
+_session = threading.local()
 
-def get_db_connection() -> psycopg2.extensions.connection:
+
+def _get_pool() -> pool.ThreadedConnectionPool:
     """
-    Retourne une connexion depuis le pool.
-    Initialise le pool si nécessaire.
+    Retourne le pool du processus, créé au premier appel.
     """
     global connection_pool
     if connection_pool is None:
-        connection_pool = psycopg2.pool.SimpleConnectionPool(
-            1,
-            10,
-            host=POSTGRES_HOST,
-            database=POSTGRES_DB,
-            user=POSTGRES_USER,
-            password=POSTGRES_PASSWORD,
-            port=POSTGRES_PORT,
-        )
-    return connection_pool.getconn()
+        with _pool_lock:
+            if connection_pool is None:
+                connection_pool = pool.ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_SIZE, **CONNECTION_PARAMETERS)
+    return connection_pool
+
+
+def warm_up_db_pool():
+    """
+    Ouvre les DB_POOL_MIN premières connexions du pool au démarrage du processus,
+    pour que les premières requêtes n'aient pas à les établir.
+    """
+    try:
+        _get_pool()
+    except psycopg2.Error as e:
+        print(f"Erreur à l'ouverture du pool de connexions: {e}", flush=True)
+
+
+def get_db_connection() -> psycopg2.extensions.connection:
+    """
+    Retourne une connexion depuis le pool, en attendant qu'une connexion se
+    libère si elles sont toutes prises.
+    """
+    with timed(DB_POOL_WAIT_SECONDS):
+        if not _pool_slots.acquire(timeout=DB_POOL_TIMEOUT):
+            raise pool.PoolError(f"no free connection after {DB_POOL_TIMEOUT}s")
+    try:
+        connexion = _get_pool().getconn()
+    except Exception:
+        _pool_slots.release()
+        raise
+    DB_POOL_IN_USE.inc()
+    return connexion
 
 
 def release_db_connection(connexion):
     """
     Replace la connexion dans le pool.
     """
-    global connection_pool
     if connection_pool and connexion:
         connection_pool.putconn(connexion)
+        DB_POOL_IN_USE.dec()
+        _pool_slots.release()
 
 
 def get_connexion_and_cursor():
@@ -75,23 +143,56 @@ def get_connexion_and_cursor():
     return connexion, connexion.cursor()
 
 
-def db_operation(commit: bool = False):
+@contextlib.contextmanager
+def db_session():
+    """
+    Partage une connexion et une transaction entre tous les appels aux fonctions
+    de ce module faits par le thread courant pendant le bloc with (ou la fonction
+    décorée). La transaction est validée à la sortie, et annulée en cas d'exception.
+    Les sessions imbriquées réutilisent la session englobante.
+    """
+    if getattr(_session, "connexion", None) is not None:
+        yield
+        return
+    connexion = get_db_connection()
+    _session.connexion = connexion
+    try:
+        yield
+        connexion.commit()
+    except Exception:
+        connexion.rollback()
+        raise
+    finally:
+        _session.connexion = None
+        release_db_connection(connexion)
+
+
+def db_operation(commit: bool = False, isolated: bool = False):
     """
     Décorateur pour centraliser la gestion de la connexion,
     du curseur, des exceptions, et du commit/rollback.
 
     Si commit=True, le commit est réalisé après l'exécution.
     En cas d'exception, le rollback est effectué.
+    Dans une db_session, la connexion de la session est utilisée et seul le
+    travail de l'appel est annulé en cas d'exception (point de sauvegarde) ; le
+    commit a lieu à la fin de la session. Avec isolated=True, l'appel garde sa
+    propre connexion et sa propre transaction, pour les écritures que d'autres
+    threads doivent voir tout de suite.
     """
 
     def decorator(func):
         def wrapper(*args, **kwargs):
+            session = None if isolated else getattr(_session, "connexion", None)
+            if session is not None:
+                return _run_in_session(session, func, commit, *args, **kwargs)
             conn, cursor = None, None
             try:
                 conn, cursor = get_connexion_and_cursor()
-                result = func(cursor, *args, **kwargs)
-                if commit:
-                    conn.commit()
+                with timed(STAGE_SECONDS, "db_write" if commit else "db_read"):
+                    result = func(cursor, *args, **kwargs)
+                    if commit:
+                        conn.commit()
                 return result
             except Exception as e:
                 print(f"Erreur dans {func.__name__}: {e}")
@@ -107,6 +208,24 @@ def db_operation(commit: bool = False):
     return decorator
 
 
+def _run_in_session(connexion, func, commit: bool, *args, **kwargs):
+    with connexion.cursor() as cursor:
+        try:
+            with timed(STAGE_SECONDS, "db_write" if commit else "db_read"):
+                cursor.execute("SAVEPOINT db_operation")
+                result = func(cursor, *args, **kwargs)
+                cursor.execute("RELEASE SAVEPOINT db_operation")
+            return result
+        except Exception as e:
+            print(f"Erreur dans {func.__name__}: {e}")
+            try:
+                cursor.execute("ROLLBACK TO SAVEPOINT db_operation")
+            except psycopg2.Error:
+                # Connexion perdue : la session échouera à son commit
+                pass
+            return None
+
+
 ####################################################################################################
 # --- Fonctions métier utilisant le décorateur ---
 
@@ -122,97 +241,174 @@ def modify_last_research_user(cursor, user_ID: str):
     )
 
 
+@db_operation()
+def get_prewarm_candidates(cursor, researched_before: datetime, visited_after: datetime, limit: int) -> list:
+    """
+    Retourne les utilisateurs venus depuis visited_after dont la watchlist n'a
+    pas été recherchée depuis researched_before, les plus fréquents d'abord,
+    avec le pays de leur dernière visite : (user_ID, username, country_code).
+    """
+    cursor.execute(
+        'SELECT user_id, letterboxd_username, last_country_code FROM "USER" '
+        "WHERE last_visit >= %s AND last_country_code IS NOT NULL "
+        "AND (last_research IS NULL OR last_research < %s) "
+        "ORDER BY visit_count DESC, last_visit DESC LIMIT %s",
+        (visited_after, researched_before, limit),
+    )
+    return cursor.fetchall()
+
+
 @db_operation(commit=True)
 def modify_user_providers(cursor, user_ID: str, country_code: str, providers: list):
     """
     Met à jour les fournisseurs pour l'utilisateur et le pays donné.
-    Ajoute les nouveaux fournisseurs et supprime ceux qui ne sont plus présents.
+    Ajoute les nouveaux fournisseurs et supprime ceux qui ne sont plus présents,
+    en une seule requête.
     """
     cursor.execute(
-        'SELECT provider_name FROM "PROVIDER" WHERE user_id = %s AND country_code = %s',
-        (user_ID, country_code),
+        'WITH removed AS ('
+        '    DELETE FROM "PROVIDER" WHERE user_id = %s AND country_code = %s AND provider_name <> ALL(%s::varchar[])'
+        ') '
+        'INSERT INTO "PROVIDER" (user_id, country_code, provider_name) '
+        "SELECT %s, %s, unnest(%s::varchar[]) ON CONFLICT DO NOTHING",
+        (user_ID, country_code, list(providers), user_ID, country_code, list(providers)),
     )
-    current_providers = [row[0] for row in cursor.fetchall()]
+    return 0
 
-    # Supprimer les fournisseurs absents de la nouvelle liste
-    providers_to_remove = [p for p in current_providers if p not in providers]
-    if providers_to_remove:
-        placeholders = ",".join(["%s"] * len(providers_to_remove))
-        cursor.execute(
-            f'DELETE FROM "PROVIDER" WHERE user_id = %s AND country_code = %s AND provider_name IN ({placeholders})',
-            (user_ID, country_code, *providers_to_remove),
+
+@db_operation(commit=True)
+def modify_film(cursor, user_ID: str, films: list, watchlist_keys: list = None):
+    """
+    Met à jour le catalogue partagé avec les films donnés et remplace la watchlist
+    de l'utilisateur par watchlist_keys (par défaut, les clés des films donnés).
+    Chaque film porte sa clé de recherche "key". Les films sans "id" n'ont pas de
+    correspondance TMDB. Les films portant "availability" remplacent leurs offres
+    dans toutes les régions.
+    Les écritures sont faites par lots, avec une requête par table, dans l'ordre
+    des clés : deux constructions qui partagent des films verrouillent leurs
+    lignes dans le même ordre et ne peuvent pas s'interbloquer.
+    """
+    now = datetime.now()
+    catalog_rows = {}
+    availability_rows = []
+    checked_ids = set()
+    lookup_rows = {}
+    for film in films:
+        film_id = film.get("id")
+        lookup_rows[film["key"]] = (film["key"], film_id)
+        if film_id is None:
+            continue
+        catalog_rows[film_id] = (
+            film_id,
+            film["title"],
+            film["note"],
+            int(film["date"]) if str(film.get("date", "")).isdigit() else None,
+            list(film.get("genres") or []),
+            now,
         )
+        if "availability" in film and film_id not in checked_ids:
+            checked_ids.add(film_id)
+            for region, offers in film["availability"].items():
+                for monetization_type, providers in offers.items():
+                    availability_rows.append((film_id, region, monetization_type, list(providers)))
+
+    # Catalogue : seules les lignes modifiées sont réécrites
+    execute_values(
+        cursor,
+        'INSERT INTO "FILM" (film_id, title, grade, date, genres, updated_at) VALUES %s '
+        "ON CONFLICT (film_id) DO UPDATE SET title = EXCLUDED.title, grade = EXCLUDED.grade, "
+        "date = EXCLUDED.date, genres = EXCLUDED.genres, updated_at = EXCLUDED.updated_at "
+        'WHERE ("FILM".title, "FILM".grade, "FILM".date, "FILM".genres) '
+        "IS DISTINCT FROM (EXCLUDED.title, EXCLUDED.grade, EXCLUDED.date, EXCLUDED.genres)",
+        sorted(catalog_rows.values()),
+        page_size=BULK_PAGE_SIZE,
+    )
 
-    # Ajouter les nouveaux fournisseurs
-    providers_to_add = [p for p in providers if p not in current_providers]
-    for provider in providers_to_add:
+    # Offres : remplacement complet pour les films revérifiés. Une construction
+    # concurrente peut réécrire les mêmes offres entre la suppression et l'insertion.
+    if checked_ids:
+        checked_ids = sorted(checked_ids)
         cursor.execute(
-            'INSERT INTO "PROVIDER" (user_ID, country_code, provider_name) VALUES (%s, %s, %s)',
-            (user_ID, country_code, provider),
+            'WITH checked AS (UPDATE "FILM" SET providers_updated_at = %s WHERE film_id = ANY(%s)) '
+            'DELETE FROM "FILM_AVAILABILITY" WHERE film_id = ANY(%s)',
+            (now, checked_ids, checked_ids),
+        )
+        execute_values(
+            cursor,
+            'INSERT INTO "FILM_AVAILABILITY" (film_id, country_code, monetization_type, providers) VALUES %s '
+            "ON CONFLICT (film_id, country_code, monetization_type) DO UPDATE SET providers = EXCLUDED.providers",
+            sorted(availability_rows),
+            page_size=BULK_PAGE_SIZE,
         )
+
+    execute_values(
+        cursor,
+        'INSERT INTO "FILM_LOOKUP" (lookup_key, film_id) VALUES %s '
+        "ON CONFLICT (lookup_key) DO UPDATE SET film_id = EXCLUDED.film_id "
+        'WHERE "FILM_LOOKUP".film_id IS DISTINCT FROM EXCLUDED.film_id',
+        [lookup_rows[key] for key in sorted(lookup_rows)],
+        page_size=BULK_PAGE_SIZE,
+    )
+
+    # Remplacement de la watchlist de l'utilisateur
+    keys = list(lookup_rows) if watchlist_keys is None else list(watchlist_keys)
+    # La nouvelle version des résultats invalide ceux gardés en cache (voir results_cache)
+    cursor.execute(
+        'WITH removed AS ('
+        '    DELETE FROM "WATCHLIST" WHERE user_id = %s AND lookup_key <> ALL(%s::varchar[])'
+        '), versioned AS ('
+        '    UPDATE "USER" SET results_version = results_version + 1 WHERE user_id = %s'
+        ') '
+        'INSERT INTO "WATCHLIST" (user_id, lookup_key) '
+        "SELECT %s, unnest(%s::varchar[]) ON CONFLICT DO NOTHING",
+        (user_ID, keys, user_ID, user_ID, keys),
+    )
     return 0
 
 
-@db_operation(commit=True)
-def modify_film(cursor, user_ID: str, country_code: str, films: list):
+@db_operation()
+def get_watchlist_keys(cursor, user_ID: str) -> list:
+    """
+    Retourne les clés de recherche des films de la watchlist de l'utilisateur.
+    """
+    cursor.execute('SELECT lookup_key FROM "WATCHLIST" WHERE user_id = %s', (user_ID,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+@db_operation()
+def get_catalog_entries(cursor, lookup_keys: list, country_code: str) -> dict:
     """
-    Met à jour la liste des films pour l'utilisateur et le pays donné.
-    Insère, met à jour ou supprime les films selon les changements.
+    Retourne les films du catalogue partagé correspondant aux clés de recherche.
+    Le dictionnaire renvoyé associe chaque clé connue à son film, ou à None si TMDB
+    n'a pas de correspondance. Les clés inconnues sont absentes.
+    Chaque film porte ses fournisseurs en abonnement dans le pays donné et
+    "providers_updated_at", la date de la dernière vérification de ses offres
+    (None si jamais vérifiées).
     """
     cursor.execute(
-        'SELECT film_id, title, grade, providers, date FROM "FILM" WHERE user_ID = %s AND country_code = %s',
-        (user_ID, country_code),
+        "SELECT l.lookup_key, f.film_id, f.title, f.grade, f.date, f.genres, a.providers, f.providers_updated_at "
+        'FROM "FILM_LOOKUP" l '
+        'LEFT JOIN "FILM" f ON f.film_id = l.film_id '
+        'LEFT JOIN "FILM_AVAILABILITY" a ON a.film_id = f.film_id AND a.country_code = %s '
+        "AND a.monetization_type = 'flatrate' "
+        "WHERE l.lookup_key = ANY(%s)",
+        (country_code, list(lookup_keys)),
     )
-    existing_films = cursor.fetchall()
-
-    # Insertion et mise à jour
-    for film in films:
-        # Si le film n'existe pas dans la BDD, insertion
-        if not any(film["title"] == row[1] for row in existing_films):
-            cursor.execute(
-                'INSERT INTO "FILM" (user_ID, country_code, film_id, title, grade, providers, date, genres) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)',
-                (
-                    user_ID,
-                    country_code,
-                    film["id"],
-                    film["title"],
-                    film["note"],
-                    json.dumps(film["providers"]),
-                    film["date"],
-                    json.dumps(film.get("genres", []) if film.get("genres") else [])
-                ),
-            )
-        else:
-            # Mise à jour en cas de modification des données
-            for row in existing_films:
-                if row[1] == film["title"]:
-                    current_grade = row[2]
-                    current_providers = json.loads(row[3]) if row[3] else []
-                    current_date = row[4]
-                    if current_grade != film["note"] or current_date != film["date"] or sorted(
-                        current_providers
-                    ) != sorted(film["providers"]):
-                        cursor.execute(
-                            'UPDATE "FILM" SET grade = %s, date = %s, providers = %s WHERE user_ID = %s AND country_code = %s AND title = %s',
-                            (
-                                film["note"],
-                                film["date"],
-                                json.dumps(film["providers"]),
-                                user_ID,
-                                country_code,
-                                film["title"],
-                            ),
-                        )
-                    break
-
-    # Suppression des films qui ne sont plus présents
-    for row in existing_films:
-        if not any(film["title"] == row[1] for film in films):
-            cursor.execute(
-                'DELETE FROM "FILM" WHERE user_ID = %s AND country_code = %s AND title = %s',
-                (user_ID, country_code, row[1]),
-            )
-    return 0
+    entries = {}
+    for row in cursor.fetchall():
+        if row[1] is None:
+            entries[row[0]] = None
+            continue
+        entries[row[0]] = {
+            "id": row[1],
+            "title": row[2],
+            "note": row[3],
+            "date": row[4],
+            "genres": row[5],
+            "providers": row[6] or [],
+            "providers_updated_at": row[7],
+        }
+    return entries
 
 
 @db_operation(commit=True)
@@ -228,24 +424,17 @@ def get_userID(cursor, username: str) -> str:
     if result:
         return result[0]
     else:
+        # Un appel concurrent a pu créer l'utilisateur entre-temps
         now = datetime.now()
         cursor.execute(
-            'INSERT INTO "USER" (letterboxd_username, created_at, last_research) VALUES (%s, %s, %s) RETURNING user_id',
+            'INSERT INTO "USER" (letterboxd_username, created_at, last_research) VALUES (%s, %s, %s) '
+            "ON CONFLICT (letterboxd_username) DO UPDATE SET letterboxd_username = EXCLUDED.letterboxd_username "
+            "RETURNING user_id",
             (username, now, now),
         )
         return cursor.fetchone()[0]
 
 
-@db_operation()
-def get_user_last_research_date(cursor, user_ID: str) -> str:
-    """
-    Retourne la date de dernière recherche de l'utilisateur.
-    """
-    cursor.execute('SELECT last_research FROM "USER" WHERE user_id = %s', (user_ID,))
-    result = cursor.fetchone()
-    return result[0] if result else None
-
-
 @db_operation()
 def get_user_providers(cursor, user_ID: str, country_code: str) -> list:
     """
@@ -258,26 +447,434 @@ def get_user_providers(cursor, user_ID: str, country_code: str) -> list:
     return [row[0] for row in cursor.fetchall()]
 
 
+# Clés de tri des résultats : expression SQL et sens, départagés par film_id
+RESULT_SORTS = {
+    "note": ("COALESCE(f.grade, 0)", "DESC"),
+    "date": ("COALESCE(f.date, 0)", "DESC"),
+    "title": ("COALESCE(f.title, '')", "ASC"),
+}
+
+
+def _results_query(
+    user_id_sql: str,
+    user_params: list,
+    country_code: str,
+    providers: list,
+    sort: str = "note",
+    limit: int = None,
+    after: tuple = None,
+    genre: str = None,
+    min_grade: float = None,
+    year_from: int = None,
+    year_to: int = None,
+) -> tuple:
+    """
+    Construit la requête des résultats d'un utilisateur (voir get_user_results),
+    dont l'identifiant est donné par l'expression SQL user_id_sql et ses paramètres.
+    Retourne la requête et ses paramètres. Les colonnes sont film_id, title,
+    grade, providers, date, genres et la valeur de tri sort_key.
+    """
+    expression, direction = RESULT_SORTS[sort]
+    conditions = [
+        'f.film_id IN (SELECT l.film_id FROM "WATCHLIST" w '
+        f'JOIN "FILM_LOOKUP" l ON l.lookup_key = w.lookup_key WHERE w.user_id = {user_id_sql})',
+        "a.providers && %s::text[]",
+    ]
+    params = [providers, country_code, *user_params, providers]
+    if genre:
+        conditions.append("f.genres @> ARRAY[%s]::text[]")
+        params.append(genre)
+    if min_grade is not None:
+        conditions.append("f.grade >= %s")
+        params.append(min_grade)
+    if year_from is not None:
+        conditions.append("f.date >= %s")
+        params.append(year_from)
+    if year_to is not None:
+        conditions.append("f.date <= %s")
+        params.append(year_to)
+    if after is not None:
+        conditions.append(f"({expression}, f.film_id) {'<' if direction == 'DESC' else '>'} (%s, %s)")
+        params.extend(after)
+    query = (
+        "SELECT f.film_id, f.title, f.grade, "
+        "ARRAY(SELECT p FROM unnest(a.providers) p WHERE p = ANY(%s::text[])) AS providers, "
+        f"f.date, f.genres, {expression} AS sort_key "
+        'FROM "FILM" f '
+        'JOIN "FILM_AVAILABILITY" a ON a.film_id = f.film_id AND a.country_code = %s '
+        "AND a.monetization_type = 'flatrate' "
+        f"WHERE {' AND '.join(conditions)} "
+        f"ORDER BY {expression} {direction}, f.film_id {direction}"
+    )
+    if limit is not None:
+        query += " LIMIT %s"
+        params.append(limit)
+    return query, params
+
+
 @db_operation()
-def get_user_results(cursor, user_ID: str, country_code: str) -> list:
+def get_user_results(cursor, user_ID: str, country_code: str, providers: list, **query) -> list:
     """
-    Retourne la liste des films pour l'utilisateur et le pays donné.
+    Retourne les films de la watchlist de l'utilisateur disponibles en abonnement
+    dans le pays donné chez au moins un des fournisseurs donnés, avec seulement
+    ces fournisseurs, triés selon sort (voir RESULT_SORTS).
+    Les filtres optionnels portent sur le genre (genre), la note minimale
+    (min_grade) et l'année (year_from, year_to).
+    Pour la pagination, limit borne le nombre de films et after est la clé
+    (valeur de tri, film_id) du dernier film de la page précédente.
+    """
+    sql, params = _results_query("%s", [user_ID], country_code, providers, **query)
+    cursor.execute(sql, params)
+    films = []
+    for row in cursor.fetchall():
+        films.append(
+            {
+                "id": row[0],
+                "title": row[1],
+                "note": row[2],
+                "providers": row[3],
+                "date": row[4],
+                "genres": row[5],
+            }
+        )
+    return films
+
+
+@db_operation()
+def get_user_films(cursor, user_ID: str, country_code: str) -> list:
+    """
+    Retourne tous les films de la watchlist de l'utilisateur disponibles en
+    abonnement dans le pays donné, avec tous leurs fournisseurs, sans ordre.
     """
     cursor.execute(
-        'SELECT film_ID, title, grade, providers, date, genres FROM "FILM" WHERE user_ID = %s AND country_code = %s',
-        (user_ID, country_code),
+        "SELECT f.film_id, f.title, f.grade, a.providers, f.date, f.genres "
+        'FROM "FILM" f '
+        'JOIN "FILM_AVAILABILITY" a ON a.film_id = f.film_id AND a.country_code = %s '
+        "AND a.monetization_type = 'flatrate' "
+        'WHERE f.film_id IN (SELECT l.film_id FROM "WATCHLIST" w '
+        'JOIN "FILM_LOOKUP" l ON l.lookup_key = w.lookup_key WHERE w.user_id = %s) '
+        "AND cardinality(a.providers) > 0",
+        (country_code, user_ID),
+    )
+    return [
+        {
+            "id": row[0],
+            "title": row[1],
+            "note": row[2],
+            "providers": row[3],
+            "date": row[4],
+            "genres": row[5],
+        }
+        for row in cursor.fetchall()
+    ]
+
+
+@db_operation(commit=True)
+def open_user_results(
+    cursor,
+    username: str,
+    country_code: str,
+    providers: list,
+    sync_providers: bool = True,
+    with_results: bool = True,
+    visit: bool = False,
+    **query,
+) -> dict:
+    """
+    Prépare une réponse de /results en une seule requête : retrouve ou crée
+    l'utilisateur, compte une visite pour le pays donné si visit, met à jour
+    ses fournisseurs pour ce pays si sync_providers, et lit ses résultats si
+    with_results (mêmes paramètres que get_user_results).
+    Retourne "user_ID", "last_research", "results_version" (changée à chaque
+    enregistrement de la watchlist), "watchlist_size" (nombre de films
+    enregistrés) et "results" (None sans with_results).
+    Les résultats sont lus avant la mise à jour des fournisseurs, dont ils ne
+    dépendent pas.
+    """
+    now = datetime.now()
+    providers = list(providers)
+    sql = (
+        "WITH found AS ("
+        '    SELECT user_id, last_research, results_version FROM "USER" WHERE letterboxd_username = %s'
+        "), visited AS ("
+        '    UPDATE "USER" v SET visit_count = v.visit_count + 1, last_visit = %s, last_country_code = %s '
+        "    FROM found WHERE %s AND v.user_id = found.user_id"
+        "), created AS ("
+        '    INSERT INTO "USER" (letterboxd_username, created_at, last_research, visit_count, last_visit, last_country_code) '
+        "    SELECT %s, %s, %s, %s, %s, %s WHERE NOT EXISTS (SELECT 1 FROM found) "
+        # Créé par une requête concurrente après le début de celle-ci : sa ligne est reprise
+        "    ON CONFLICT (letterboxd_username) DO UPDATE SET "
+        '    visit_count = "USER".visit_count + EXCLUDED.visit_count, '
+        '    last_visit = COALESCE(EXCLUDED.last_visit, "USER".last_visit), '
+        '    last_country_code = COALESCE(EXCLUDED.last_country_code, "USER".last_country_code) '
+        "    RETURNING user_id, last_research, results_version"
+        "), u AS ("
+        "    SELECT * FROM found UNION ALL SELECT * FROM created"
+        "), removed AS ("
+        '    DELETE FROM "PROVIDER" p USING u '
+        "    WHERE %s AND p.user_id = u.user_id AND p.country_code = %s AND p.provider_name <> ALL(%s::varchar[])"
+        "), added AS ("
+        '    INSERT INTO "PROVIDER" (user_id, country_code, provider_name) '
+        "    SELECT u.user_id, %s, unnest(%s::varchar[]) FROM u WHERE %s ON CONFLICT DO NOTHING"
+        ") "
+        "SELECT u.user_id, u.last_research, u.results_version, "
+        '(SELECT COUNT(*) FROM "WATCHLIST" w WHERE w.user_id = u.user_id)'
+    )
+    params = [
+        username,
+        now, country_code, visit,
+        username, now, now, int(visit), now if visit else None, country_code if visit else None,
+        sync_providers, country_code, providers,
+        country_code, providers, sync_providers,
+    ]
+    if with_results:
+        results_sql, results_params = _results_query("u.user_id", [], country_code, providers, **query)
+        direction = RESULT_SORTS[query.get("sort") or "note"][1]
+        sql += (
+            ", (SELECT COALESCE(json_agg(json_build_object("
+            "'id', r.film_id, 'title', r.title, 'note', r.grade, 'providers', r.providers, "
+            "'date', r.date, 'genres', r.genres"
+            f") ORDER BY r.sort_key {direction}, r.film_id {direction}), '[]') FROM ({results_sql}) r)"
+        )
+        params.extend(results_params)
+    cursor.execute(sql + " FROM u", params)
+    row = cursor.fetchone()
+    return {
+        "user_ID": row[0],
+        "last_research": row[1],
+        "results_version": row[2],
+        "watchlist_size": row[3],
+        "results": row[4] if with_results else None,
+    }
+
+
+@db_operation()
+def get_common_results(cursor, user_IDs: list, country_code: str, providers: list) -> list:
+    """
+    Retourne les films présents dans la watchlist de tous les utilisateurs donnés
+    et disponibles en abonnement dans le pays chez au moins un des fournisseurs
+    donnés, triés par note décroissante. Seuls ces fournisseurs sont retournés.
+    """
+    cursor.execute(
+        "SELECT f.film_id, f.title, f.grade, "
+        "ARRAY(SELECT p FROM unnest(a.providers) p WHERE p = ANY(%s::text[])), "
+        "f.date, f.genres "
+        'FROM "FILM" f '
+        'JOIN "FILM_AVAILABILITY" a ON a.film_id = f.film_id AND a.country_code = %s '
+        "AND a.monetization_type = 'flatrate' "
+        "WHERE f.film_id IN ("
+        '    SELECT l.film_id FROM "WATCHLIST" w '
+        '    JOIN "FILM_LOOKUP" l ON l.lookup_key = w.lookup_key '
+        "    WHERE w.user_id = ANY(%s) AND l.film_id IS NOT NULL "
+        "    GROUP BY l.film_id HAVING COUNT(DISTINCT w.user_id) = %s"
+        ") AND a.providers && %s::text[] "
+        "ORDER BY f.grade DESC NULLS LAST, f.film_id",
+        (providers, country_code, user_IDs, len(set(user_IDs)), providers),
     )
-    result = cursor.fetchall()
     films = []
-    for row in result:
+    for row in cursor.fetchall():
         films.append(
             {
                 "id": row[0],
                 "title": row[1],
                 "note": row[2],
-                "providers": json.loads(row[3]),
+                "providers": row[3],
                 "date": row[4],
-                "genres": json.loads(row[5]) if row[5] else [],
+                "genres": row[5],
             }
         )
     return films
+
+
+@db_operation()
+def get_cached_response(cursor, url: str):
+    """
+    Retourne la réponse TMDB en cache pour l'URL donnée et sa date d'expiration.
+    Retourne None si l'URL n'est pas en cache ou si l'entrée a expiré.
+    """
+    cursor.execute(
+        'SELECT payload, expires_at FROM "TMDB_CACHE" WHERE url = %s AND expires_at > %s',
+        (url, datetime.now()),
+    )
+    result = cursor.fetchone()
+    return (json.loads(result[0]), result[1]) if result else None
+
+
+@db_operation(commit=True)
+def set_cached_response(cursor, url: str, payload, expires_at: datetime):
+    """
+    Enregistre (ou remplace) la réponse TMDB en cache pour l'URL donnée.
+    """
+    cursor.execute(
+        'INSERT INTO "TMDB_CACHE" (url, payload, expires_at) VALUES (%s, %s, %s) '
+        "ON CONFLICT (url) DO UPDATE SET payload = EXCLUDED.payload, expires_at = EXCLUDED.expires_at",
+        (url, json.dumps(payload), expires_at),
+    )
+    return 0
+
+
+@db_operation(commit=True)
+def purge_cached_responses(cursor):
+    """
+    Supprime les réponses TMDB expirées du cache.
+    """
+    cursor.execute('DELETE FROM "TMDB_CACHE" WHERE expires_at <= %s', (datetime.now(),))
+    return cursor.rowcount
+
+
+JOB_FIELDS = (
+    "job_id",
+    "username",
+    "country_code",
+    "status",
+    "stage",
+    "pages_scraped",
+    "films_total",
+    "films_enriched",
+    "error",
+    "created_at",
+    "updated_at",
+)
+
+
+@db_operation(commit=True, isolated=True)
+def create_job(cursor, job_id: str, username: str, country_code: str, timeout_minutes: int) -> tuple:
+    """
+    Crée un job de construction des résultats pour l'utilisateur et le pays donné.
+    Si un job est déjà actif pour ce couple, il est réutilisé.
+    Les jobs actifs sans nouvelles depuis timeout_minutes sont considérés comme
+    interrompus.
+    Retourne l'identifiant du job actif et True s'il vient d'être créé.
+    """
+    now = datetime.now()
+    cursor.execute(
+        "UPDATE \"JOB\" SET status = 'failed', error = 'Interrupted', updated_at = %s "
+        "WHERE username = %s AND country_code = %s AND status IN ('queued', 'running') AND updated_at < %s",
+        (now, username, country_code, now - timedelta(minutes=timeout_minutes)),
+    )
+    cursor.execute(
+        "DELETE FROM \"JOB\" WHERE status IN ('done', 'failed') AND updated_at < %s",
+        (now - timedelta(days=1),),
+    )
+    cursor.execute(
+        'INSERT INTO "JOB" (job_id, username, country_code, status, created_at, updated_at) '
+        "VALUES (%s, %s, %s, 'queued', %s, %s) "
+        "ON CONFLICT (username, country_code) WHERE status IN ('queued', 'running') DO NOTHING "
+        "RETURNING job_id",
+        (job_id, username, country_code, now, now),
+    )
+    if cursor.fetchone():
+        return job_id, True
+    cursor.execute(
+        "SELECT job_id FROM \"JOB\" WHERE username = %s AND country_code = %s AND status IN ('queued', 'running')",
+        (username, country_code),
+    )
+    return cursor.fetchone()[0], False
+
+
+@db_operation()
+def get_job(cursor, job_id: str) -> dict:
+    """
+    Retourne l'état du job donné, ou None s'il n'existe pas.
+    """
+    cursor.execute(f'SELECT {", ".join(JOB_FIELDS)} FROM "JOB" WHERE job_id = %s', (job_id,))
+    result = cursor.fetchone()
+    return dict(zip(JOB_FIELDS, result)) if result else None
+
+
+@db_operation(commit=True)
+def modify_job(cursor, job_id: str, **fields):
+    """
+    Met à jour les champs donnés du job (statut, étape, progression, erreur).
+    """
+    fields = {field: value for field, value in fields.items() if field in JOB_FIELDS}
+    assignments = ", ".join(f"{field} = %s" for field in fields)
+    cursor.execute(
+        f'UPDATE "JOB" SET {assignments}{", " if assignments else ""}updated_at = %s WHERE job_id = %s',
+        (*fields.values(), datetime.now(), job_id),
+    )
+    return 0
+
+
+# Les verrous consultatifs d'un processus sont pris sur une connexion dédiée,
+# hors du pool : une construction garde le sien pendant des minutes.
+_lock_connexion = None
+_lock_mutex = threading.Lock()
+# Clés verrouillées par ce processus : la même session Postgres peut reprendre
+# un verrou qu'elle détient déjà, ce qui ne doit pas arriver entre deux threads.
+_held_locks = set()
+
+
+def _lock_query(query: str, key: str) -> bool:
+    global _lock_connexion
+    if _lock_connexion is None or _lock_connexion.closed:
+        _lock_connexion = psycopg2.connect(**CONNECTION_PARAMETERS)
+        # Hors transaction : le verrou est lié à la session et non à une transaction
+        _lock_connexion.autocommit = True
+    with _lock_connexion.cursor() as cursor:
+        cursor.execute(query, (key,))
+        return cursor.fetchone()[0]
+
+
+def _try_advisory_lock(key: str) -> bool:
+    with _lock_mutex:
+        if key in _held_locks:
+            return False
+        acquired = _lock_query("SELECT pg_try_advisory_lock(hashtext(%s))", key)
+        if acquired:
+            _held_locks.add(key)
+        return acquired
+
+
+def _advisory_unlock(key: str):
+    with _lock_mutex:
+        _held_locks.discard(key)
+        _lock_query("SELECT pg_advisory_unlock(hashtext(%s))", key)
+
+
+@contextlib.contextmanager
+def advisory_lock(key: str, timeout: float, on_wait=None):
+    """
+    Prend un verrou consultatif Postgres identifié par key, partagé par tous les
+    processus du backend, et le garde pendant le bloc with.
+    Attend au plus timeout secondes ; on_wait est appelé une fois si le verrou
+    est déjà pris. Produit True si le verrou a été obtenu, False sinon.
+    """
+    acquired = False
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            acquired = _try_advisory_lock(key)
+            if acquired or time.monotonic() >= deadline:
+                break
+            if on_wait is not None:
+                on_wait()
+                on_wait = None
+            time.sleep(1)
+        yield acquired
+    finally:
+        if acquired:
+            _advisory_unlock(key)
+
+
+@contextlib.asynccontextmanager
+async def advisory_lock_async(key: str, timeout: float, on_wait=None):
+    """
+    Comme advisory_lock, dans une coroutine : l'attente se fait sur la boucle
+    d'événements, sans occuper de thread pendant des minutes.
+    """
+    acquired = False
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            acquired = await asyncio.to_thread(_try_advisory_lock, key)
+            if acquired or time.monotonic() >= deadline:
+                break
+            if on_wait is not None:
+                on_wait()
+                on_wait = None
+            await asyncio.sleep(1)
+        yield acquired
+    finally:
+        if acquired:
+            await asyncio.to_thread(_advisory_unlock, key)
@@ -1,12 +1,25 @@
+import asyncio
 import random
+import re
 import time
+import httpx
 import requests
+from html.parser import HTMLParser
+from requests.adapters import HTTPAdapter
+import contextlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import quote
 import os
 from dotenv import load_dotenv
-from playwright.sync_api import sync_playwright
 from playwright.sync_api import Error as PlaywrightError
 from fake_useragent import UserAgent
+from functions.browser_pool import BrowserPool
+from functions.rate_limit import TokenBucket
+from functions.tmdb_client import AsyncTMDBClient, TMDBClient
+from functions.single_flight import AsyncSingleFlight, SingleFlight
+from functions.cache_functions import get_cached, set_cached
+from functions.metrics import STAGE_SECONDS, timed
 
 dotenv_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), '.env')
 if os.path.exists(dotenv_path):
@@ -21,10 +34,213 @@ if TMDB_TOKEN is None:
         "TMDB_TOKEN environment variable not set. Please set it in your .env file or container environment."
     )
 
-headers = {
-    "accept": "application/json",
-    "Authorization": f"Bearer {TMDB_TOKEN}",
+# Base URLs of the services, overridable to run against local stand-ins (see benchmarks/).
+TMDB_API_URL = os.getenv("TMDB_API_URL", "https://api.themoviedb.org/3").rstrip("/")
+LETTERBOXD_URL = os.getenv("LETTERBOXD_URL", "https://letterboxd.com").rstrip("/")
+
+# Client-side limits for The Movie Database API, per backend process.
+TMDB_RATE_LIMIT = float(os.getenv("TMDB_RATE_LIMIT", "20"))
+TMDB_BURST = float(os.getenv("TMDB_BURST", "20"))
+TMDB_TIMEOUT = float(os.getenv("TMDB_TIMEOUT", "10"))
+TMDB_MAX_RETRIES = int(os.getenv("TMDB_MAX_RETRIES", "4"))
+TMDB_MAX_RETRY_DELAY = float(os.getenv("TMDB_MAX_RETRY_DELAY", "30"))
+TMDB_POOL_SIZE = int(os.getenv("TMDB_POOL_SIZE", "32"))
+
+tmdb_client = TMDBClient(
+    TMDB_TOKEN,
+    rate=TMDB_RATE_LIMIT,
+    burst=TMDB_BURST,
+    timeout=TMDB_TIMEOUT,
+    max_retries=TMDB_MAX_RETRIES,
+    max_retry_delay=TMDB_MAX_RETRY_DELAY,
+    pool_size=TMDB_POOL_SIZE,
+)
+tmdb_flight = SingleFlight()
+# Same for the builds run on an event loop, within the same request rate
+tmdb_async_client = AsyncTMDBClient(
+    TMDB_TOKEN,
+    tmdb_client.limiter,
+    timeout=TMDB_TIMEOUT,
+    max_retries=TMDB_MAX_RETRIES,
+    max_retry_delay=TMDB_MAX_RETRY_DELAY,
+    pool_size=TMDB_POOL_SIZE,
+)
+tmdb_async_flight = AsyncSingleFlight()
+
+# Cache lifetime of TMDB responses, in seconds, per endpoint.
+TMDB_TTL_REGIONS = int(os.getenv("TMDB_TTL_REGIONS", str(7 * 24 * 3600)))
+TMDB_TTL_GENRES = int(os.getenv("TMDB_TTL_GENRES", str(7 * 24 * 3600)))
+TMDB_TTL_REGION_PROVIDERS = int(os.getenv("TMDB_TTL_REGION_PROVIDERS", str(24 * 3600)))
+TMDB_TTL_WATCH_PROVIDERS = int(os.getenv("TMDB_TTL_WATCH_PROVIDERS", str(6 * 3600)))
+TMDB_TTL_SEARCH = int(os.getenv("TMDB_TTL_SEARCH", str(3 * 24 * 3600)))
+
+# Number of long-lived Chromium browsers per backend process, and number of page
+# loads after which a browser is relaunched.
+BROWSER_POOL_SIZE = max(1, int(os.getenv("BROWSER_POOL_SIZE", "2")))
+BROWSER_MAX_PAGES = max(1, int(os.getenv("BROWSER_MAX_PAGES", "50")))
+
+# Number of tabs loading watchlist pages at the same time during one scrape.
+LETTERBOXD_TABS = max(1, int(os.getenv("LETTERBOXD_TABS", "4")))
+# Politeness budget towards Letterboxd, shared by every scrape of this process:
+# sustained page loads per second, and burst size.
+LETTERBOXD_PAGES_PER_SECOND = float(os.getenv("LETTERBOXD_PAGES_PER_SECOND", "2"))
+LETTERBOXD_BURST = float(os.getenv("LETTERBOXD_BURST", "4"))
+letterboxd_limiter = TokenBucket(LETTERBOXD_PAGES_PER_SECOND, LETTERBOXD_BURST)
+
+# Fetch watchlist pages over plain HTTP before falling back to Playwright.
+LETTERBOXD_HTTP_SCRAPER = os.getenv("LETTERBOXD_HTTP_SCRAPER", "1") == "1"
+LETTERBOXD_HTTP_TIMEOUT = float(os.getenv("LETTERBOXD_HTTP_TIMEOUT", "20"))
+WATCHLIST_PAGE_LINK = re.compile(r"/watchlist/page/(\d+)/?")
+
+letterboxd_session = requests.Session()
+letterboxd_session.mount(LETTERBOXD_URL, HTTPAdapter(pool_connections=1, pool_maxsize=LETTERBOXD_TABS))
+letterboxd_session.headers.update({
+    'User-Agent': UserAgent().random,
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+})
+
+# Selectors to cover multiple Letterboxd markups (react + classic posters), in
+# order of preference.
+POSTER_SELECTORS = (
+    # Modern posters
+    "div.film-poster",
+    # Older / alternative poster containers
+    "ul.poster-list li.poster-container",
+    ".poster-container",
+    # React-ish markup (some pages/users)
+    "li.griditem div.react-component[data-item-name]",
+    "li.griditem div.react-component",
+    "div.react-component[data-item-name]",
+    "div.react-component[data-film-id]",
+    "li.griditem",
+)
+POSTER_WAIT_TIMEOUT_MS = int(os.getenv("POSTER_WAIT_TIMEOUT_MS", "15000"))
+LAZY_LOAD_TIMEOUT_MS = int(os.getenv("LAZY_LOAD_TIMEOUT_MS", "5000"))
+# True once the number of posters is the same on two consecutive polls
+LAZY_LOAD_SETTLED_SCRIPT = """
+selector => {
+    const count = document.querySelectorAll(selector).length;
+    const settled = count > 0 && count === window.__watchlistPosterCount;
+    window.__watchlistPosterCount = count;
+    return settled;
 }
+"""
+# Poster selector that matched last, tried first on the next pages.
+_preferred_selector = None
+
+# Poster attributes read from the watchlist pages, and the in-page script that
+# collects them for every poster of a page in one call. It follows the same
+# lookup order as extract_film_info_from_react_component.
+POSTER_ATTRIBUTES = (
+    "data-film-name",
+    "data-film-release-year",
+    "data-item-name",
+    "data-film-slug",
+    "data-item-slug",
+    "data-target-link",
+    "data-item-link",
+)
+BATCH_EXTRACT_SCRIPT = """
+(elements, names) => elements.map(element => {
+    const target = element.hasAttribute('data-film-name') ? element
+        : element.querySelector('div.film-poster[data-film-name]')
+        || element.querySelector('div.react-component[data-item-name]')
+        || (element.hasAttribute('data-item-name') ? element : null)
+        || element.querySelector('div.react-component');
+    const attributes = {};
+    if (target) {
+        for (const name of names) {
+            const value = target.getAttribute(name);
+            if (value !== null) attributes[name] = value;
+        }
+    }
+    if (!attributes['data-film-name'] && !attributes['data-item-name']) {
+        // Last resort: some poster markup exposes title in the image alt
+        const img = element.querySelector('img[alt]');
+        if (img && img.alt) attributes['data-film-name'] = img.alt;
+    }
+    return attributes;
+})
+"""
+
+# Monetization types kept from the TMDB watch/providers responses.
+MONETIZATION_TYPES = ("flatrate", "rent", "buy", "free", "ads")
+
+# Maximum number of TMDB requests in flight at once while enriching a watchlist.
+TMDB_MAX_IN_FLIGHT = max(1, int(os.getenv("TMDB_MAX_IN_FLIGHT", "8")))
+
+
+def _tmdb_get(url: str, ttl: int) -> tuple[int, dict | None]:
+    """
+    GET a TMDB endpoint through the response cache.
+    Returns the HTTP status code and the JSON payload. Only 200 responses are cached.
+    Concurrent calls for the same URL share a single request.
+    """
+    return tmdb_flight.do(url, lambda: _fetch_tmdb(url, ttl))
+
+
+def _fetch_tmdb(url: str, ttl: int) -> tuple[int, dict | None]:
+    data = get_cached(url)
+    if data is not None:
+        return 200, data
+    response = tmdb_client.get(url)
+    if response.status_code != 200:
+        return response.status_code, None
+    data = response.json()
+    set_cached(url, data, ttl)
+    return 200, data
+
+
+def _iter_bounded(func, items: list):
+    """
+    Apply func to every item with at most TMDB_MAX_IN_FLIGHT calls running at once,
+    yielding the results as the calls complete. The first exception is raised and
+    the calls that have not started yet are cancelled, as they are when the
+    consumer stops iterating.
+    """
+    if TMDB_MAX_IN_FLIGHT == 1 or len(items) <= 1:
+        for item in items:
+            yield func(item)
+        return
+    executor = ThreadPoolExecutor(
+        max_workers=min(TMDB_MAX_IN_FLIGHT, len(items)),
+        thread_name_prefix="tmdb",
+    )
+    try:
+        for future in as_completed([executor.submit(func, item) for item in items]):
+            yield future.result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+class ScrapeTimings:
+    """
+    Time spent waiting (politeness limiter, page readiness) versus working
+    (fetching, parsing, extracting) during one scrape. Durations are summed over
+    the concurrent tabs or requests of the scrape.
+    """
+
+    def __init__(self):
+        self.waiting = 0.0
+        self.working = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, kind: str, seconds: float):
+        with self._lock:
+            setattr(self, kind, getattr(self, kind) + seconds)
+
+    @contextlib.contextmanager
+    def measure(self, kind: str):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(kind, time.monotonic() - started)
+
+    def __str__(self):
+        return f"waited {self.waiting:.1f}s, worked {self.working:.1f}s"
+
 
 def _goto_with_retries(page, url: str, *, timeout_ms: int = 60000, max_attempts: int = 3) -> bool:
     """
@@ -52,207 +268,415 @@ def _goto_with_retries(page, url: str, *, timeout_ms: int = 60000, max_attempts:
         print(f"❌ Giving up navigating to {url}: {last_err}", flush=True)
     return False
 
-def get_watchlist(username: str) -> list:
+def _new_scrape_context(browser):
+    """
+    Create an isolated browser context for one scrape, with a random user agent
+    and the stealth script applied.
     """
-    Retrieve the watchlist of a Letterboxd user via Playwright scraping.
+    user_agent = UserAgent().random
+    context = browser.new_context(
+        viewport={'width': 1920, 'height': 1080},
+        user_agent=user_agent,
+        extra_http_headers={
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8',
+            'Accept-Language': 'en-US,en;q=0.5',
+            'Accept-Encoding': 'gzip, deflate, br',
+            'DNT': '1',
+            'Connection': 'keep-alive',
+            'Upgrade-Insecure-Requests': '1',
+        }
+    )
+
+    # Add stealth script to hide automation
+    context.add_init_script("""
+        Object.defineProperty(navigator, 'webdriver', {
+            get: () => undefined,
+        });
+
+        // Remove automation indicators
+        delete window.cdc_adoQpoasnfa76pfcZLmcfl_Array;
+        delete window.cdc_adoQpoasnfa76pfcZLmcfl_Promise;
+        delete window.cdc_adoQpoasnfa76pfcZLmcfl_Symbol;
+    """)
+    return context
+
+
+browser_pool = BrowserPool(
+    BROWSER_POOL_SIZE,
+    BROWSER_MAX_PAGES,
+    [
+        '--no-sandbox',
+        '--disable-blink-features=AutomationControlled',
+        '--disable-dev-shm-usage',
+        '--disable-gpu',
+        '--no-first-run',
+        '--disable-default-apps',
+        '--disable-features=TranslateUI',
+        '--disable-ipc-flooding-protection',
+    ],
+    _new_scrape_context,
+)
+
+
+def get_watchlist(username: str, progress=None) -> list:
+    """
+    Retrieve the watchlist of a Letterboxd user.
+    Pages are fetched over plain HTTP first; Playwright scraping is used when
+    Letterboxd blocks those requests or serves markup without the film data.
     This function is best-effort: it will return partial results if some pages fail.
+    If given, progress is called with the number of pages scraped after each page.
     """
-    watchlist: list[dict] = []
     print(f"Scraping watchlist for user: {username}", flush=True)
+    timings = ScrapeTimings()
+    watchlist = _scrape_watchlist_http(username, progress, timings) if LETTERBOXD_HTTP_SCRAPER else None
+    if watchlist is None:
+        watchlist = []
+        browser_pool.run(lambda context: _scrape_watchlist(context, username, watchlist, progress, timings))
+    # Print results
+    print(f"Total films collected: {len(watchlist)} ({timings})", flush=True)
+    return watchlist
 
-    ua = UserAgent()
-    user_agent = ua.random
-
-    with sync_playwright() as p:
-        browser = p.chromium.launch(
-            headless=True,
-            args=[
-                '--no-sandbox',
-                '--disable-blink-features=AutomationControlled',
-                '--disable-dev-shm-usage',
-                '--disable-gpu',
-                '--no-first-run',
-                '--disable-default-apps',
-                '--disable-features=TranslateUI',
-                '--disable-ipc-flooding-protection',
-                '--user-agent=' + user_agent
-            ]
-        )
-        
-        context = browser.new_context(
-            viewport={'width': 1920, 'height': 1080},
-            user_agent=user_agent,
-            extra_http_headers={
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8',
-                'Accept-Language': 'en-US,en;q=0.5',
-                'Accept-Encoding': 'gzip, deflate, br',
-                'DNT': '1',
-                'Connection': 'keep-alive',
-                'Upgrade-Insecure-Requests': '1',
-            }
-        )
-        
-        # Add stealth script to hide automation
-        context.add_init_script("""
-            Object.defineProperty(navigator, 'webdriver', {
-                get: () => undefined,
-            });
-            
-            // Remove automation indicators
-            delete window.cdc_adoQpoasnfa76pfcZLmcfl_Array;
-            delete window.cdc_adoQpoasnfa76pfcZLmcfl_Promise;
-            delete window.cdc_adoQpoasnfa76pfcZLmcfl_Symbol;
-        """)
-        
-        page = context.new_page()
-        page.set_default_navigation_timeout(60000)
-        page.set_default_timeout(60000)
-        def _apply_zoom():
-            try:
-                page.evaluate("document.body.style.zoom = '50%'")
-            except Exception:
-                pass
-        
-        
-        # Visit the user's watchlist page
-        first_url = f"https://letterboxd.com/{username}/watchlist/"
-        if not _goto_with_retries(page, first_url, timeout_ms=60000, max_attempts=3):
-            context.close()
-            browser.close()
-            return watchlist
-        _apply_zoom()
-
-        extract_films(page, watchlist)
-
-        # Paginate by clicking numbered links if present (2, 3, 4, ...)
-        page_number = 2
-        while True:
+
+def _scrape_watchlist(context, username: str, watchlist: list, progress=None, timings: ScrapeTimings | None = None):
+    """
+    Scrape every page of the watchlist of a Letterboxd user into watchlist.
+    The page count is read from the first page, then the other pages are loaded
+    concurrently in LETTERBOXD_TABS tabs of the given browser context, each page
+    load taking a token from the politeness limiter.
+    """
+    def _open_tab():
+        tab = context.new_page()
+        tab.set_default_navigation_timeout(60000)
+        tab.set_default_timeout(60000)
+        return tab
+
+    def _apply_zoom(tab):
+        try:
+            tab.evaluate("document.body.style.zoom = '50%'")
+        except Exception:
+            pass
+
+    # Visit the user's watchlist page
+    timings = timings or ScrapeTimings()
+    page = _open_tab()
+    timings.add("waiting", letterboxd_limiter.acquire())
+    with timed(STAGE_SECONDS, "scrape_page"):
+        if not _goto_with_retries(page, _watchlist_page_url(username, 1), timeout_ms=60000, max_attempts=3):
+            return
+    _apply_zoom(page)
+    page_count = _read_page_count(page)
+
+    with timed(STAGE_SECONDS, "extract"):
+        extract_films(page, watchlist, timings)
+    if progress:
+        progress(1)
+
+    # Load the other pages by batches of concurrent tabs
+    page_numbers = list(range(2, page_count + 1))
+    tabs = [page] + [_open_tab() for _ in range(min(LETTERBOXD_TABS, len(page_numbers)) - 1)]
+    pages_scraped = 1
+    for start in range(0, len(page_numbers), len(tabs)):
+        batch = list(zip(tabs, page_numbers[start:start + len(tabs)]))
+        started = {}
+        for tab, page_number in batch:
+            timings.add("waiting", letterboxd_limiter.acquire())
             try:
-                # Ensure pagination is in view / loaded
-                page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                link = page.get_by_role("link", name=str(page_number), exact=True)
-                if link.count() == 0:
-                    break
+                started_at = time.perf_counter()
+                tab.goto(_watchlist_page_url(username, page_number), wait_until="commit", timeout=60000)
+                started[page_number] = started_at
+            except Exception as e:
+                print(f"⚠️ Could not start loading page {page_number}: {str(e)[:160]}", flush=True)
+
+        batch_films = []
+        for tab, page_number in batch:
+            loaded = False
+            if started.get(page_number):
                 try:
-                    with page.expect_navigation(wait_until="domcontentloaded", timeout=60000):
-                        link.first.click()
+                    with timings.measure("waiting"):
+                        tab.wait_for_load_state("domcontentloaded", timeout=60000)
+                    STAGE_SECONDS.labels("scrape_page").observe(time.perf_counter() - started[page_number])
+                    loaded = True
                 except Exception:
-                    # Some navigations are not detected; best-effort fallback
-                    link.first.click()
-                    page.wait_for_load_state("domcontentloaded", timeout=60000)
-                _apply_zoom()
-                # Small delay to reduce rate limiting / bot detection
-                page.wait_for_timeout(1500)
-                extract_films(page, watchlist)
-                page_number += 1
-            except Exception:
-                break
-        
-        # Print results
-        print(f"Total films collected: {len(watchlist)}", flush=True)
-        
-        # Close the browser and context
-        context.close()
-        browser.close()
-        
-    return watchlist
+                    pass
+            if not loaded:
+                timings.add("waiting", letterboxd_limiter.acquire())
+                with timed(STAGE_SECONDS, "scrape_page"):
+                    loaded = _goto_with_retries(tab, _watchlist_page_url(username, page_number), timeout_ms=60000, max_attempts=3)
+            if not loaded:
+                # Best-effort: keep the films of the other pages
+                continue
+            _apply_zoom(tab)
+            page_films = []
+            with timed(STAGE_SECONDS, "extract"):
+                extract_films(tab, page_films, timings)
+            batch_films.append(page_films)
+            pages_scraped += 1
+            if progress:
+                progress(pages_scraped)
 
-def get_ids(watchlist: list) -> list:
+        # Merge in page order through the (title, date) dedup
+        existing = {(f.get("title"), f.get("date")) for f in watchlist}
+        for page_films in batch_films:
+            for film in page_films:
+                key = (film.get("title"), film.get("date"))
+                if key not in existing:
+                    existing.add(key)
+                    watchlist.append(film)
+
+
+def _watchlist_page_url(username: str, page_number: int) -> str:
+    if page_number == 1:
+        return f"{LETTERBOXD_URL}/{username}/watchlist/"
+    return f"{LETTERBOXD_URL}/{username}/watchlist/page/{page_number}/"
+
+
+def _read_page_count(page) -> int:
     """
-    Retrieve the film id and note from The Movie Database API.
+    Read the number of pages of a watchlist from the pagination of its first page.
     """
-    indexed_watchlist = []
-    genres = get_genres_id()
-    for index, film in enumerate(watchlist):
-        title_url_compatible = quote(film["title"])
-        if "date" in film:
-            response = requests.get(
-                f'https://api.themoviedb.org/3/search/movie?query={title_url_compatible}&primary_release_year={film["date"]}',
-                headers=headers,
-            )
-        else:
-            response = requests.get(
-                f"https://api.themoviedb.org/3/search/movie?query={title_url_compatible}",
-                headers=headers,
-            )
+    try:
+        numbers = page.eval_on_selector_all(
+            ".paginate-pages a, li.paginate-page a",
+            "links => links.map(link => parseInt(link.textContent.trim(), 10)).filter(n => !isNaN(n))",
+        )
+    except Exception as e:
+        print(f"⚠️ Could not read the pagination: {str(e)[:160]}", flush=True)
+        return 1
+    return max(numbers, default=1)
+
+class _WatchlistParser(HTMLParser):
+    """
+    Streaming parser of a Letterboxd watchlist page. Collects the films from the
+    same poster attributes as extract_film_info_from_react_component, and the
+    page numbers linked by the pagination.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.films = []
+        self.page_numbers = set()
+
+    def handle_starttag(self, tag, attrs):
+        attributes = dict(attrs)
+        film_info = _film_info_from_attributes(attributes)
+        if film_info:
+            self.films.append(film_info)
+        elif tag == "a" and attributes.get("href"):
+            match = WATCHLIST_PAGE_LINK.search(attributes["href"])
+            if match:
+                self.page_numbers.add(int(match.group(1)))
 
+
+def _film_info_from_attributes(attributes: dict) -> dict | None:
+    """
+    Build the film information of a poster element from its attributes, or
+    return None if the element is not a poster.
+    """
+    if attributes.get("data-film-name"):
+        film_info = {"title": attributes["data-film-name"]}
+        year = attributes.get("data-film-release-year")
+        if year and str(year).isdigit():
+            film_info["date"] = int(year)
+    elif attributes.get("data-item-name"):
+        title = attributes["data-item-name"]
+        film_info = {"title": title}
+        # Extract year from title if present (e.g., "Philadelphia (1993)")
+        if "(" in title and ")" in title:
+            year_part = title.split("(")[-1].split(")")[0]
+            if year_part.isdigit() and len(year_part) == 4:
+                film_info = {"title": title.split("(")[0].strip(), "date": int(year_part)}
+    else:
+        return None
+    slug = film_slug(
+        attributes.get("data-film-slug") or attributes.get("data-item-slug"),
+        attributes.get("data-target-link") or attributes.get("data-item-link"),
+    )
+    if slug:
+        film_info["slug"] = slug
+    return film_info
+
+
+def _fetch_watchlist_page_http(username: str, page_number: int, timings: ScrapeTimings) -> _WatchlistParser | None:
+    """
+    Fetch and parse one watchlist page over HTTP.
+    Returns None when the page cannot be fetched or has no film data.
+    """
+    timings.add("waiting", letterboxd_limiter.acquire())
+    url = _watchlist_page_url(username, page_number)
+    with timings.measure("working"), timed(STAGE_SECONDS, "scrape_page"):
+        return _parse_watchlist_page_http(url)
+
+
+def _parse_watchlist_page_http(url: str) -> _WatchlistParser | None:
+    try:
+        response = letterboxd_session.get(url, timeout=LETTERBOXD_HTTP_TIMEOUT, stream=True)
+    except requests.RequestException as e:
+        print(f"⚠️ HTTP fetch of {url} failed: {str(e)[:160]}", flush=True)
+        return None
+    with response:
         if response.status_code != 200:
-            raise Exception(
-                f"Failed to retrieve the film id for '{film}'. HTTP Status Code: {response.status_code}"
-            )
+            print(f"⚠️ HTTP fetch of {url} returned {response.status_code}", flush=True)
+            return None
+        response.encoding = response.encoding or "utf-8"
+        parser = _WatchlistParser()
+        for chunk in response.iter_content(chunk_size=65536, decode_unicode=True):
+            parser.feed(chunk)
+        parser.close()
+    if not parser.films:
+        # Block pages and JS-only markup have no poster attributes
+        print(f"⚠️ HTTP fetch of {url} has no film data", flush=True)
+        return None
+    return parser
+
+
+def _scrape_watchlist_http(username: str, progress=None, timings: ScrapeTimings | None = None) -> list | None:
+    """
+    Scrape the watchlist of a Letterboxd user with plain pooled HTTP requests.
+    Returns None when Playwright is needed instead: a page is blocked, or the
+    first page has no film data in its HTML.
+    """
+    timings = timings or ScrapeTimings()
+    first_page = _fetch_watchlist_page_http(username, 1, timings)
+    if first_page is None:
+        return None
+    if progress:
+        progress(1)
+
+    pages = [first_page]
+    page_numbers = list(range(2, max(first_page.page_numbers, default=1) + 1))
+    if page_numbers:
+        executor = ThreadPoolExecutor(max_workers=min(LETTERBOXD_TABS, len(page_numbers)), thread_name_prefix="letterboxd")
+        try:
+            for page in executor.map(lambda n: _fetch_watchlist_page_http(username, n, timings), page_numbers):
+                if page is None:
+                    return None
+                pages.append(page)
+                if progress:
+                    progress(len(pages))
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    return _merge_pages(pages)
+
+
+def _merge_pages(pages: list) -> list:
+    """
+    Merge the films of the parsed pages in page order through the (title, date) dedup.
+    """
+    watchlist = []
+    existing = set()
+    for page in pages:
+        for film in page.films:
+            key = (film.get("title"), film.get("date"))
+            if key not in existing:
+                existing.add(key)
+                watchlist.append(film)
+    print(f"Scraped {len(pages)} pages over HTTP", flush=True)
+    return watchlist
 
-        data = response.json()
-        if data["results"]:
-            watchlist[index]["id"] = data["results"][0]["id"]
-            watchlist[index]["note"] = round(data["results"][0]["vote_average"], 1)
-            watchlist[index]["date"] = data["results"][0]["release_date"].split("-")[0]
-            watchlist[index]["genres"] = [genres[genre_id] for genre_id in data["results"][0]["genre_ids"] if genre_id in genres]
-            indexed_watchlist.append(watchlist[index])
-        indexed_watchlist.sort(key=lambda x: x.get("note", 0), reverse=True)
 
-    return indexed_watchlist
+def _search_url(film: dict) -> str:
+    title_url_compatible = quote(film["title"])
+    if "date" in film:
+        return f'{TMDB_API_URL}/search/movie?query={title_url_compatible}&primary_release_year={film["date"]}'
+    return f"{TMDB_API_URL}/search/movie?query={title_url_compatible}"
 
 
-def get_providers(watchlist: list) -> list:
+def _search_film(film: dict) -> dict | None:
     """
-    Retrieve the film providers from The Movie Database API.
+    Search a single film on The Movie Database API and return its best match.
     """
-    for index, film in enumerate(watchlist):
-        id = int(film["id"])
-        response = requests.get(
-            f"https://api.themoviedb.org/3/movie/{id}/watch/providers", headers=headers
+    status_code, data = _tmdb_get(_search_url(film), TMDB_TTL_SEARCH)
+
+    if status_code != 200:
+        raise Exception(
+            f"Failed to retrieve the film id for '{film}'. HTTP Status Code: {status_code}"
         )
 
-        if response.status_code != 200:
-            raise Exception(
-                f"Failed to retrieve the film providers for '{film}'. HTTP Status Code: {response.status_code}"
-            )
+    return data["results"][0] if data["results"] else None
+
+
+def _fetch_film_providers(film: dict) -> dict:
+    """
+    Retrieve the providers of a single film in every region from The Movie Database API.
+    Returns {region: {monetization_type: [provider_name, ...]}}.
+    """
+    id = int(film["id"])
+    status_code, data = _tmdb_get(
+        f"{TMDB_API_URL}/movie/{id}/watch/providers", TMDB_TTL_WATCH_PROVIDERS
+    )
+
+    if status_code != 200:
+        raise Exception(
+            f"Failed to retrieve the film providers for '{film}'. HTTP Status Code: {status_code}"
+        )
+
+    return _availability(data)
 
-        providers = []
-        data = response.json()
-        if (
-            "results" in data
-            and "FR" in data["results"]
-            and "flatrate" in data["results"]["FR"]
-        ):
-            flatrate = data["results"]["FR"]["flatrate"]
-            for provider in flatrate:
-                providers.append(provider["provider_name"])
-        watchlist[index]["providers"] = providers
 
-    return [film for film in watchlist if film["providers"]]
+def _availability(data: dict) -> dict:
+    availability = {}
+    for region, offers in data.get("results", {}).items():
+        region_offers = {
+            monetization_type: [provider["provider_name"] for provider in offers[monetization_type]]
+            for monetization_type in MONETIZATION_TYPES
+            if offers.get(monetization_type)
+        }
+        if region_offers:
+            availability[region] = region_offers
+    return availability
 
 
-def sort_watchlist(watchlist: list, providers: list) -> list:
+def _enrich_film(film: dict, country_code: str, genres: dict) -> dict:
     """
-    Sort the watchlist by providers.
+    Search a film on The Movie Database API unless it already has an id, then
+    retrieve its offers. The film gets its offers per region and monetization type
+    in "availability", and its flatrate providers for country_code in "providers".
     """
-    sorted_watchlist = []
-    for film in watchlist:
-        new_providers = [
-            provider for provider in film["providers"] if provider in providers
-        ]
-        if new_providers:
-            film["providers"] = new_providers
-            sorted_watchlist.append(film)
-    return sorted_watchlist
+    if "id" not in film:
+        with timed(STAGE_SECONDS, "tmdb_search"):
+            match = _search_film(film)
+        if not match:
+            return film
+        _apply_match(film, match, genres)
+    with timed(STAGE_SECONDS, "tmdb_providers"):
+        film["availability"] = _fetch_film_providers(film)
+    film["providers"] = film["availability"].get(country_code, {}).get("flatrate", [])
+    return film
+
+
+def _apply_match(film: dict, match: dict, genres: dict):
+    film["id"] = match["id"]
+    film["note"] = round(match["vote_average"], 1)
+    film["date"] = match["release_date"].split("-")[0]
+    film["genres"] = [genres[genre_id] for genre_id in match["genre_ids"] if genre_id in genres]
+
+
+def enrich_films(watchlist: list, country_code: str):
+    """
+    Search the films without an id on The Movie Database API and retrieve the
+    offers of every film, each film going through both steps without waiting for
+    the others. Films are updated in place and yielded as soon as they are done;
+    films without a TMDB match are yielded without "id".
+    """
+    genres = get_genres_id() if any("id" not in film for film in watchlist) else {}
+    yield from _iter_bounded(lambda film: _enrich_film(film, country_code, genres), watchlist)
 
 
 def get_region_providers(country_code: str) -> list:
     """
     Retrieve the movie streaming platform for a specific region.
     """
-    response = requests.get(
-        f"https://api.themoviedb.org/3/watch/providers/movie?watch_region={country_code}",
-        headers=headers,
+    status_code, data = _tmdb_get(
+        f"{TMDB_API_URL}/watch/providers/movie?watch_region={country_code}",
+        TMDB_TTL_REGION_PROVIDERS,
     )
-    if response.status_code != 200:
+    if status_code != 200:
         raise Exception(
             f"Impossible to retrieve the movie streaming platform for your region : {country_code}"
         )
 
     region_providers = []
-    data = response.json()
     if data["results"]:
         response_providers = data["results"]
         for response_provider in response_providers:
@@ -269,80 +693,62 @@ def get_all_regions() -> list:
     """
     Retrieve all regions from The Movie Database API.
     """
-    response = requests.get(
-        "https://api.themoviedb.org/3/watch/providers/regions?language=en-US",
-        headers=headers,
+    status_code, data = _tmdb_get(
+        f"{TMDB_API_URL}/watch/providers/regions?language=en-US",
+        TMDB_TTL_REGIONS,
     )
-    if response.status_code != 200:
+    if status_code != 200:
         raise Exception(
-            f"Failed to retrieve the regions. HTTP Status Code: {response.status_code}"
+            f"Failed to retrieve the regions. HTTP Status Code: {status_code}"
         )
-    data = response.json()
     regions = []
     for region in data["results"]:
         regions.append(region["iso_3166_1"])
     return regions
 
 
-def extract_films(page, watchlist: list):
+def extract_films(page, watchlist: list, timings: ScrapeTimings | None = None):
     """
-    Extract films from a Letterboxd watchlist page with enhanced detection evasion.
+    Extract films from a Letterboxd watchlist page.
+    Waits for the poster grid and for lazy loading to settle instead of sleeping;
+    the time spent waiting is added to timings if given.
     """
+    global _preferred_selector
+    timings = timings or ScrapeTimings()
     try:
-        # Simulate human behavior
-        time.sleep(random.uniform(2, 5))
-
-        # Navigate like a human - scroll gradually
-        page.evaluate("""
-            window.scrollTo({
-                top: 0,
-                behavior: 'smooth'
-            });
-        """)
-        time.sleep(2)
-        
-        # Wait for the page to be usable (networkidle is often flaky on modern sites)
-        page.wait_for_load_state('domcontentloaded', timeout=60000)
-        try:
-            page.wait_for_load_state('load', timeout=30000)
-        except Exception:
-            # Best-effort; selectors below will be the real gate.
-            pass
-        
-        # Selectors to cover multiple Letterboxd markups (react + classic posters)
-        selectors_to_try = [
-            # Modern posters
-            "div.film-poster",
-            # Older / alternative poster containers
-            "ul.poster-list li.poster-container",
-            ".poster-container",
-            # React-ish markup (some pages/users)
-            "li.griditem div.react-component[data-item-name]",
-            "li.griditem div.react-component",
-            "div.react-component[data-item-name]",
-            "div.react-component[data-film-id]",
-            "li.griditem",
-        ]
-        
-        element_found = False
-        selected_selector = None
-        
-        # Scroll down gradually to trigger lazy loading
-        for i in range(3):
-            page.evaluate(f"window.scrollTo(0, {(i + 1) * 500})")
-            time.sleep(1)
-        
-        # Try each selector quickly (don't burn minutes per page)
-        for selector in selectors_to_try:
+        # Wait until any known poster markup is in the DOM (one wait for all selectors)
+        with timings.measure("waiting"):
+            page.wait_for_load_state('domcontentloaded', timeout=60000)
             try:
-                page.wait_for_selector(selector, timeout=6000)
+                page.wait_for_selector(", ".join(POSTER_SELECTORS), timeout=POSTER_WAIT_TIMEOUT_MS)
                 element_found = True
-                selected_selector = selector
-                break
             except Exception as e:
-                print(f"❌ Selector {selector} failed: {str(e)[:140]}...", flush=True)
-                continue
-        
+                print(f"❌ No poster selector matched: {str(e)[:140]}...", flush=True)
+                element_found = False
+
+        selected_selector = None
+        if element_found:
+            # The selector that worked last time is tried first, then the others in order
+            candidates = [_preferred_selector] if _preferred_selector else []
+            candidates += [selector for selector in POSTER_SELECTORS if selector != _preferred_selector]
+            for selector in candidates:
+                if page.query_selector(selector):
+                    selected_selector = _preferred_selector = selector
+                    break
+            element_found = selected_selector is not None
+
+        if element_found:
+            # Trigger lazy loading and wait until the number of posters stops changing
+            with timings.measure("waiting"):
+                try:
+                    page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+                    page.wait_for_function(
+                        LAZY_LOAD_SETTLED_SCRIPT, arg=selected_selector, polling=250, timeout=LAZY_LOAD_TIMEOUT_MS
+                    )
+                except Exception:
+                    # Best-effort; the posters already in the DOM are extracted below
+                    pass
+
         if not element_found:
             # Helpful diagnostics: often a block page or an error page.
             try:
@@ -359,30 +765,77 @@ def extract_films(page, watchlist: list):
                 print(f"❌ Could not find any film containers (title={title!r}).", flush=True)
             return
         
-        # Extract films using the successful selector
-        film_elements = page.query_selector_all(selected_selector)
+        work_started = time.monotonic()
+        # Extract films using the successful selector: one in-page call for the
+        # whole page, the per-element path is only a fallback
         existing = {(f.get("title"), f.get("date")) for f in watchlist if isinstance(f, dict)}
-        
-        # Process each element
-        for i, element in enumerate(film_elements):
-            try:
-                film_info = extract_film_info_from_react_component(element)
-                if film_info:
-                    key = (film_info.get("title"), film_info.get("date"))
-                    if key not in existing:
-                        existing.add(key)
-                        watchlist.append(film_info)
-                else:
-                    print(f"  ❌ Failed to extract info from element {i+1}", flush=True)
-            except Exception as e:
-                print(f"❌ Error processing film element {i+1}: {e}", flush=True)
-                continue
-        print(f"Extracted {len(film_elements)} films in page {page.url.split('/')[-2] if page.url.split('/')[-3] == 'page' else 1}", flush=True)
+        film_infos = _extract_film_infos_batch(page, selected_selector)
+        if film_infos is not None:
+            film_count = len(film_infos)
+        else:
+            film_elements = page.query_selector_all(selected_selector)
+            film_count = len(film_elements)
+            film_infos = []
+            for i, element in enumerate(film_elements):
+                try:
+                    film_infos.append(extract_film_info_from_react_component(element))
+                except Exception as e:
+                    print(f"❌ Error processing film element {i+1}: {e}", flush=True)
+
+        for i, film_info in enumerate(film_infos):
+            if film_info:
+                key = (film_info.get("title"), film_info.get("date"))
+                if key not in existing:
+                    existing.add(key)
+                    watchlist.append(film_info)
+            else:
+                print(f"  ❌ Failed to extract info from element {i+1}", flush=True)
+        timings.add("working", time.monotonic() - work_started)
+        print(f"Extracted {film_count} films in page {page.url.split('/')[-2] if page.url.split('/')[-3] == 'page' else 1}", flush=True)
 
     except Exception as e:
         print(f"💥 Critical error in extract_films: {e}", flush=True)
         return
 
+def _extract_film_infos_batch(page, selector: str) -> list | None:
+    """
+    Collect the poster attributes of every element matching selector with a single
+    in-page script, and turn them into film information.
+    Returns None if the script failed or found no usable poster, so that the caller
+    can fall back to the per-element path.
+    """
+    try:
+        attributes = page.eval_on_selector_all(selector, BATCH_EXTRACT_SCRIPT, list(POSTER_ATTRIBUTES))
+    except Exception as e:
+        print(f"⚠️ Batch extraction failed, falling back to per-element extraction: {str(e)[:140]}", flush=True)
+        return None
+    film_infos = [_film_info_from_attributes(element_attributes) for element_attributes in attributes]
+    if attributes and not any(film_infos):
+        return None
+    return film_infos
+
+
+def film_slug(slug: str | None, link: str | None) -> str | None:
+    """
+    Return the Letterboxd slug of a film from its slug attribute or its "/film/<slug>/" link.
+    """
+    if slug:
+        return slug
+    if link and "/film/" in link:
+        return link.rstrip("/").split("/film/")[-1] or None
+    return None
+
+
+def _add_slug(film_info: dict, element):
+    """Add the Letterboxd slug of the element to film_info when it exposes one."""
+    slug = film_slug(
+        element.get_attribute("data-film-slug") or element.get_attribute("data-item-slug"),
+        element.get_attribute("data-target-link") or element.get_attribute("data-item-link"),
+    )
+    if slug:
+        film_info["slug"] = slug
+
+
 def extract_film_info_from_react_component(element):
     """Extract film information from various Letterboxd element shapes."""
     try:
@@ -393,6 +846,7 @@ def extract_film_info_from_react_component(element):
             film_info = {"title": film_name}
             if year and str(year).isdigit():
                 film_info["date"] = int(year)
+            _add_slug(film_info, element)
             return film_info
 
         # Sometimes the container holds the film-poster div
@@ -404,6 +858,7 @@ def extract_film_info_from_react_component(element):
                 film_info = {"title": film_name}
                 if year and str(year).isdigit():
                     film_info["date"] = int(year)
+                _add_slug(film_info, poster)
                 return film_info
 
         # First, try to find the react component div within the element
@@ -447,7 +902,8 @@ def extract_film_info_from_react_component(element):
             film_info = {"title": title}
             if year:
                 film_info["date"] = year
-                
+            _add_slug(film_info, react_component)
+
             return film_info
         
     except Exception as e:
@@ -459,15 +915,170 @@ def get_genres_id() -> dict:
     """
     Retrieve the genres from The Movie Database API.
     """
-    response = requests.get(
-        "https://api.themoviedb.org/3/genre/movie/list?language=en-US", headers=headers
+    status_code, data = _tmdb_get(
+        f"{TMDB_API_URL}/genre/movie/list?language=en-US", TMDB_TTL_GENRES
     )
-    if response.status_code != 200:
+    if status_code != 200:
         raise Exception(
-            f"Failed to retrieve the genres. HTTP Status Code: {response.status_code}"
+            f"Failed to retrieve the genres. HTTP Status Code: {status_code}"
         )
-    data = response.json()
     genres = {}
     for genre in data["genres"]:
         genres[genre["id"]] = genre["name"]
     return genres
+
+
+# Asynchronous variants of the build steps, for the builds run on an event loop
+# (see ASYNC_BUILDS in job_functions). They share the caches, rate limiters and
+# parsing of the functions above; the Playwright fallback keeps running on the
+# browser pool threads.
+
+_letterboxd_async_client = None
+
+
+def _get_letterboxd_async_client() -> httpx.AsyncClient:
+    global _letterboxd_async_client
+    if _letterboxd_async_client is None:
+        _letterboxd_async_client = httpx.AsyncClient(
+            timeout=LETTERBOXD_HTTP_TIMEOUT,
+            headers=dict(letterboxd_session.headers),
+            follow_redirects=True,
+        )
+    return _letterboxd_async_client
+
+
+async def get_watchlist_async(username: str, progress=None) -> list:
+    """
+    Same as get_watchlist, for coroutines. progress is a plain function and is
+    called from a worker thread.
+    """
+    print(f"Scraping watchlist for user: {username}", flush=True)
+    timings = ScrapeTimings()
+    watchlist = await _scrape_watchlist_http_async(username, progress, timings) if LETTERBOXD_HTTP_SCRAPER else None
+    if watchlist is None:
+        watchlist = []
+        await asyncio.to_thread(
+            browser_pool.run, lambda context: _scrape_watchlist(context, username, watchlist, progress, timings)
+        )
+    print(f"Total films collected: {len(watchlist)} ({timings})", flush=True)
+    return watchlist
+
+
+async def _fetch_watchlist_page_http_async(username: str, page_number: int, timings: ScrapeTimings) -> _WatchlistParser | None:
+    timings.add("waiting", await letterboxd_limiter.acquire_async())
+    url = _watchlist_page_url(username, page_number)
+    with timings.measure("working"), timed(STAGE_SECONDS, "scrape_page"):
+        try:
+            response = await _get_letterboxd_async_client().get(url)
+        except httpx.HTTPError as e:
+            print(f"⚠️ HTTP fetch of {url} failed: {str(e)[:160]}", flush=True)
+            return None
+        if response.status_code != 200:
+            print(f"⚠️ HTTP fetch of {url} returned {response.status_code}", flush=True)
+            return None
+        parser = _WatchlistParser()
+        parser.feed(response.text)
+        parser.close()
+    if not parser.films:
+        print(f"⚠️ HTTP fetch of {url} has no film data", flush=True)
+        return None
+    return parser
+
+
+async def _scrape_watchlist_http_async(username: str, progress=None, timings: ScrapeTimings | None = None) -> list | None:
+    """
+    Same as _scrape_watchlist_http, with at most LETTERBOXD_TABS pages in flight.
+    """
+    timings = timings or ScrapeTimings()
+    first_page = await _fetch_watchlist_page_http_async(username, 1, timings)
+    if first_page is None:
+        return None
+    pages_scraped = 1
+    if progress:
+        await asyncio.to_thread(progress, pages_scraped)
+
+    tabs = asyncio.Semaphore(LETTERBOXD_TABS)
+
+    async def fetch(page_number: int):
+        nonlocal pages_scraped
+        async with tabs:
+            page = await _fetch_watchlist_page_http_async(username, page_number, timings)
+        if page is not None:
+            pages_scraped += 1
+            if progress:
+                await asyncio.to_thread(progress, pages_scraped)
+        return page
+
+    page_numbers = range(2, max(first_page.page_numbers, default=1) + 1)
+    pages = [first_page, *await asyncio.gather(*(fetch(page_number) for page_number in page_numbers))]
+    if any(page is None for page in pages):
+        return None
+    return _merge_pages(pages)
+
+
+async def _tmdb_get_async(url: str, ttl: int) -> tuple[int, dict | None]:
+    """
+    Same as _tmdb_get, for coroutines.
+    """
+    return await tmdb_async_flight.do(url, lambda: _fetch_tmdb_async(url, ttl))
+
+
+async def _fetch_tmdb_async(url: str, ttl: int) -> tuple[int, dict | None]:
+    data = await asyncio.to_thread(get_cached, url)
+    if data is not None:
+        return 200, data
+    response = await tmdb_async_client.get(url)
+    if response.status_code != 200:
+        return response.status_code, None
+    data = response.json()
+    await asyncio.to_thread(set_cached, url, data, ttl)
+    return 200, data
+
+
+async def _enrich_film_async(film: dict, country_code: str, genres: dict) -> dict:
+    """
+    Same as _enrich_film, for coroutines.
+    """
+    if "id" not in film:
+        with timed(STAGE_SECONDS, "tmdb_search"):
+            status_code, data = await _tmdb_get_async(_search_url(film), TMDB_TTL_SEARCH)
+        if status_code != 200:
+            raise Exception(
+                f"Failed to retrieve the film id for '{film}'. HTTP Status Code: {status_code}"
+            )
+        if not data["results"]:
+            return film
+        _apply_match(film, data["results"][0], genres)
+    with timed(STAGE_SECONDS, "tmdb_providers"):
+        status_code, data = await _tmdb_get_async(
+            f"{TMDB_API_URL}/movie/{int(film['id'])}/watch/providers", TMDB_TTL_WATCH_PROVIDERS
+        )
+    if status_code != 200:
+        raise Exception(
+            f"Failed to retrieve the film providers for '{film}'. HTTP Status Code: {status_code}"
+        )
+    film["availability"] = _availability(data)
+    film["providers"] = film["availability"].get(country_code, {}).get("flatrate", [])
+    return film
+
+
+async def enrich_films_async(watchlist: list, country_code: str):
+    """
+    Same as enrich_films, for coroutines: an asynchronous generator of the films
+    as they are done, with at most TMDB_MAX_IN_FLIGHT films in progress. The first
+    exception is raised and the films still in progress are cancelled.
+    """
+    genres = await asyncio.to_thread(get_genres_id) if any("id" not in film for film in watchlist) else {}
+    in_flight = asyncio.Semaphore(TMDB_MAX_IN_FLIGHT)
+
+    async def enrich(film: dict) -> dict:
+        async with in_flight:
+            return await _enrich_film_async(film, country_code, genres)
+
+    tasks = [asyncio.ensure_future(enrich(film)) for film in watchlist]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,339 @@
+import asyncio
+import contextvars
+import os
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functions.db_functions import (
+    advisory_lock,
+    advisory_lock_async,
+    create_job,
+    modify_job,
+    modify_last_research_user,
+)
+from functions.build_functions import build_watchlist, build_watchlist_async
+from functions.tracing import trace_id
+
+logger = logging.getLogger(__name__)
+
+# Number of builds run at the same time by each backend process.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Run the builds as coroutines of one event loop per process instead of one
+# thread each, so that a process holds many builds in flight while they wait on
+# TMDB and Letterboxd. On by default in the ASGI server mode.
+ASYNC_BUILDS = os.getenv("ASYNC_BUILDS", "1" if os.getenv("SERVER_MODE") == "asgi" else "0") == "1"
+# Number of builds run at the same time by each backend process with ASYNC_BUILDS.
+ASYNC_JOB_WORKERS = int(os.getenv("ASYNC_JOB_WORKERS", "200"))
+# Threads running the database calls of those builds, and of their lock waits,
+# one connection of the pool each.
+ASYNC_BUILD_THREADS = int(os.getenv("ASYNC_BUILD_THREADS", "8"))
+# Active jobs without progress for this long are considered interrupted.
+JOB_TIMEOUT_MINUTES = int(os.getenv("JOB_TIMEOUT_MINUTES", "15"))
+# Minimum delay between two progress writes of a job, in seconds.
+PROGRESS_INTERVAL = 1.0
+
+PUBLIC_JOB_FIELDS = ("job_id", "username", "status", "stage", "pages_scraped", "films_total", "films_enriched", "error")
+
+_executor = None
+_executor_lock = threading.Lock()
+_loop = None
+_loop_slots = None
+# Event channels of the jobs running in this process, by job id.
+_channels = {}
+_channels_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """
+    Return the worker pool of this process, created on first use so that each
+    gunicorn worker gets its own after forking.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+        return _executor
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """
+    Return the event loop running the builds of this process with ASYNC_BUILDS,
+    started on first use in a thread of its own.
+    """
+    global _loop, _loop_slots
+    with _executor_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            _loop.set_default_executor(ThreadPoolExecutor(max_workers=ASYNC_BUILD_THREADS, thread_name_prefix="job-db"))
+            _loop_slots = asyncio.Semaphore(ASYNC_JOB_WORKERS)
+            threading.Thread(target=_loop.run_forever, name="job-loop", daemon=True).start()
+        return _loop
+
+
+class JobChannel:
+    """
+    Events of a job running in this process (progress, films, outcome).
+    Every subscriber receives all the events from the start, so clients that
+    attach late still get the films already found.
+    """
+
+    def __init__(self):
+        self._events = []
+        self._closed = False
+        self._condition = threading.Condition()
+        # (event loop, asyncio.Event) of the asynchronous subscribers waiting
+        self._waiters = set()
+
+    def publish(self, event: dict):
+        with self._condition:
+            self._events.append(event)
+            self._notify()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._notify()
+
+    def _notify(self):
+        self._condition.notify_all()
+        for loop, waiter in self._waiters:
+            loop.call_soon_threadsafe(waiter.set)
+
+    def subscribe(self, timeout: float):
+        """
+        Yield the events of the job until it ends. None is yielded when no event
+        arrived for timeout seconds, so that the caller can keep its connection alive.
+        """
+        index = 0
+        while True:
+            with self._condition:
+                if index == len(self._events) and not self._closed:
+                    self._condition.wait(timeout)
+                events = self._events[index:]
+                closed = self._closed
+            index += len(events)
+            if events:
+                yield from events
+            elif closed:
+                return
+            else:
+                yield None
+
+    async def subscribe_async(self, timeout: float):
+        """
+        Same as subscribe, as an asynchronous generator that waits without a thread.
+        """
+        loop = asyncio.get_running_loop()
+        index = 0
+        while True:
+            waiter = (loop, asyncio.Event())
+            with self._condition:
+                idle = index == len(self._events) and not self._closed
+                if idle:
+                    self._waiters.add(waiter)
+            if idle:
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                finally:
+                    with self._condition:
+                        self._waiters.discard(waiter)
+            with self._condition:
+                events = self._events[index:]
+                closed = self._closed
+            index += len(events)
+            if events:
+                for event in events:
+                    yield event
+            elif closed:
+                return
+            else:
+                yield None
+
+
+def get_job_channel(job_id: str) -> JobChannel | None:
+    """
+    Return the event channel of a job queued or running in this process, if any.
+    """
+    with _channels_lock:
+        return _channels.get(job_id)
+
+
+class JobProgress:
+    """
+    Collects the progress of a running job and writes it at most once per
+    PROGRESS_INTERVAL. Stage changes are written immediately. Each write is
+    also published on the job's channel.
+    """
+
+    def __init__(self, job_id: str, channel: JobChannel):
+        self.job_id = job_id
+        self.channel = channel
+        self._state = {}
+        self._pending = {}
+        self._last_write = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, **fields):
+        with self._lock:
+            self._pending.update(fields)
+            if "stage" not in fields and time.monotonic() - self._last_write < PROGRESS_INTERVAL:
+                return
+            pending, self._pending = self._pending, {}
+            self._last_write = time.monotonic()
+        self._write(pending)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if pending:
+            self._write(pending)
+
+    def _write(self, fields: dict):
+        modify_job(self.job_id, **fields)
+        with self._lock:
+            self._state.update(fields)
+            state = dict(self._state)
+        self.channel.publish({"type": "progress", **state})
+
+
+def public_job(job: dict) -> dict:
+    """
+    Return the fields of a job exposed by the API.
+    """
+    return {field: job.get(field) for field in PUBLIC_JOB_FIELDS}
+
+
+def enqueue_build(user_ID: str, username: str, country_code: str) -> str | None:
+    """
+    Queue a build of the results of a user for a country and return its job id.
+    A build already queued or running for the same username and country, in any
+    backend process, is reused. Returns None if the job could not be created.
+    """
+    job = create_job(str(uuid.uuid4()), username, country_code, JOB_TIMEOUT_MINUTES)
+    if job is None:
+        return None
+    job_id, created = job
+    if created:
+        with _channels_lock:
+            _channels[job_id] = JobChannel()
+        # The build logs with the trace id of the request that queued it
+        if ASYNC_BUILDS:
+            asyncio.run_coroutine_threadsafe(
+                _run_build_async(job_id, user_ID, username, country_code, trace_id.get()), _get_loop()
+            )
+        else:
+            _get_executor().submit(contextvars.copy_context().run, _run_build, job_id, user_ID, username, country_code)
+    return job_id
+
+
+def run_build(user_ID: str, username: str, country_code: str) -> str | None:
+    """
+    Create a build job like enqueue_build, but run it in the calling thread.
+    Returns its job id once it ended, or None if a build of these results was
+    already queued or running, or if the job could not be created.
+    """
+    job = create_job(str(uuid.uuid4()), username, country_code, JOB_TIMEOUT_MINUTES)
+    if job is None or not job[1]:
+        return None
+    _run_build(job[0], user_ID, username, country_code)
+    return job[0]
+
+
+def _run_build(job_id: str, user_ID: str, username: str, country_code: str):
+    """
+    Execute a build job, publish its events and record its outcome.
+    Builds of the same username and country never overlap, even across backend
+    processes: a job that outlived its timeout may still be running elsewhere.
+    """
+    logger.info("Job %s started for user=%s country=%s", job_id, username, country_code)
+    channel = get_job_channel(job_id) or JobChannel()
+    modify_job(job_id, status="running")
+    progress = JobProgress(job_id, channel)
+    try:
+        with _build_lock(job_id, username, country_code) as acquired:
+            if not acquired:
+                _fail(job_id, channel, "Another build of these results is still running.")
+                return
+            watchlist = build_watchlist(
+                user_ID,
+                username,
+                country_code,
+                progress,
+                lambda film: channel.publish({"type": "film", "film": film}),
+            )
+        _finish(job_id, user_ID, channel, progress, watchlist)
+    except Exception as e:
+        logger.exception("Job %s failed for %s", job_id, username)
+        progress.flush()
+        _fail(job_id, channel, f"Failed to load results: {str(e)}")
+    finally:
+        channel.close()
+        with _channels_lock:
+            _channels.pop(job_id, None)
+
+
+async def _run_build_async(job_id: str, user_ID: str, username: str, country_code: str, trace: str):
+    """
+    Same as _run_build, as a coroutine of the build loop, logging with the trace
+    id given. The database calls run in the threads of the loop.
+    """
+    trace_id.set(trace)
+    channel = get_job_channel(job_id) or JobChannel()
+    progress = JobProgress(job_id, channel)
+    try:
+        async with _loop_slots:
+            logger.info("Job %s started for user=%s country=%s", job_id, username, country_code)
+            await asyncio.to_thread(modify_job, job_id, status="running")
+            async with _build_lock(job_id, username, country_code, advisory_lock_async) as acquired:
+                if not acquired:
+                    await asyncio.to_thread(_fail, job_id, channel, "Another build of these results is still running.")
+                    return
+                watchlist = await build_watchlist_async(
+                    user_ID,
+                    username,
+                    country_code,
+                    progress,
+                    lambda film: channel.publish({"type": "film", "film": film}),
+                )
+            await asyncio.to_thread(_finish, job_id, user_ID, channel, progress, watchlist)
+    except Exception as e:
+        logger.exception("Job %s failed for %s", job_id, username)
+        await asyncio.to_thread(progress.flush)
+        await asyncio.to_thread(_fail, job_id, channel, f"Failed to load results: {str(e)}")
+    finally:
+        channel.close()
+        with _channels_lock:
+            _channels.pop(job_id, None)
+
+
+def _build_lock(job_id: str, username: str, country_code: str, lock=advisory_lock):
+    return lock(
+        f"build:{username}:{country_code}",
+        JOB_TIMEOUT_MINUTES * 60,
+        lambda: logger.info("Job %s waiting for another build of %s", job_id, username),
+    )
+
+
+def _finish(job_id: str, user_ID: str, channel: JobChannel, progress: JobProgress, watchlist: list | None):
+    """
+    Record the outcome of a build that ran to its end.
+    """
+    progress.flush()
+    if watchlist is None:
+        _fail(job_id, channel, "Failed to retrieve watchlist from Letterboxd.")
+        return
+    # An empty scrape is not recorded, like before, so it is retried next time
+    if watchlist:
+        modify_last_research_user(user_ID)
+    modify_job(job_id, status="done", stage=None)
+    channel.publish({"type": "done", "count": len(watchlist)})
+    logger.info("Job %s finished (count=%s)", job_id, len(watchlist))
+
+
+def _fail(job_id: str, channel: JobChannel, error: str):
+    modify_job(job_id, status="failed", error=error)
+    channel.publish({"type": "error", "error": error})
@@ -0,0 +1,94 @@
+import contextlib
+import os
+import time
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Under gunicorn, PROMETHEUS_MULTIPROC_DIR makes every worker write its samples
+# there so that /metrics reports the whole backend whichever worker serves it.
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+# From a cached TMDB lookup to a 20-minute build
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200)
+
+STAGE_SECONDS = Histogram(
+    "watchlist_stage_seconds",
+    "Duration of the hot-path stages: scrape_page, extract, tmdb_search, "
+    "tmdb_providers, db_read, db_write, sort.",
+    ["stage"],
+    buckets=DURATION_BUCKETS,
+)
+BUILD_SECONDS = Histogram(
+    "watchlist_build_seconds",
+    "Duration of the watchlist build stages (scraping, providers, saving) and of whole builds (total).",
+    ["stage"],
+    buckets=DURATION_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    "watchlist_http_request_seconds",
+    "Duration of the API requests, streams excluded.",
+    ["endpoint", "method", "status"],
+    buckets=DURATION_BUCKETS,
+)
+TMDB_REQUESTS = Counter(
+    "watchlist_tmdb_requests_total",
+    "TMDB HTTP attempts by status code (error when no response was received).",
+    ["status"],
+)
+CACHE_LOOKUPS = Counter(
+    "watchlist_cache_lookups_total",
+    "Cache lookups by tier (memory and postgres for TMDB responses, results for /results) and result (hit, miss).",
+    ["tier", "result"],
+)
+DB_POOL_WAIT_SECONDS = Histogram(
+    "watchlist_db_pool_wait_seconds",
+    "Time spent getting a connection from the Postgres pool.",
+    buckets=DURATION_BUCKETS,
+)
+DB_POOL_IN_USE = Gauge(
+    "watchlist_db_pool_connections_in_use",
+    "Postgres pool connections checked out, summed over the backend processes.",
+    multiprocess_mode="livesum",
+)
+BROWSER_LIFETIME_SECONDS = Histogram(
+    "watchlist_browser_lifetime_seconds",
+    "Lifetime of the pooled Chromium browsers, from launch to recycling.",
+    buckets=DURATION_BUCKETS,
+)
+BROWSER_PAGES = Histogram(
+    "watchlist_browser_pages",
+    "Pages loaded by a pooled Chromium browser before it was recycled.",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500),
+)
+
+
+@contextlib.contextmanager
+def timed(histogram, *labels):
+    """
+    Observe the duration of the with block in histogram, with the given label values.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        (histogram.labels(*labels) if labels else histogram).observe(time.perf_counter() - started)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """
+    Return the metrics in the Prometheus text format and its content type.
+    """
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
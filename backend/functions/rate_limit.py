@@ -0,0 +1,55 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter.
+    Tokens are refilled continuously at `rate` per second, up to `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def _take(self, tokens: float) -> float:
+        """
+        Take tokens if available and return 0, else return the delay before they are.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1) -> float:
+        """
+        Take tokens from the bucket, sleeping until they are available.
+        Returns the number of seconds spent waiting.
+        """
+        waited = 0.0
+        while delay := self._take(tokens):
+            time.sleep(delay)
+            waited += delay
+        return waited
+
+    async def acquire_async(self, tokens: float = 1) -> float:
+        """
+        Same as acquire, for coroutines: waits without blocking the event loop.
+        The bucket is shared with the threads calling acquire.
+        """
+        waited = 0.0
+        while delay := self._take(tokens):
+            await asyncio.sleep(delay)
+            waited += delay
+        return waited
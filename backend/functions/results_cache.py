@@ -0,0 +1,153 @@
+import bisect
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from functions.cache_functions import LRUCache
+from functions.db_functions import get_user_films
+from functions.metrics import CACHE_LOOKUPS
+
+# Number of (user, country) watchlists kept in the in-process cache of /results
+# (0 disables it), and how long one is kept. A watchlist is reloaded as soon as
+# its version changes (a build saved it); the lifetime bounds how long offers
+# refreshed by the builds of other users take to show.
+RESULTS_CACHE_SIZE = int(os.getenv("RESULTS_CACHE_SIZE", "1024"))
+RESULTS_CACHE_TTL = timedelta(seconds=int(os.getenv("RESULTS_CACHE_TTL", "600")))
+# Provider-filtered views kept per watchlist, for the provider sets asked last.
+VIEWS_PER_WATCHLIST = 8
+
+# Sort keys of the results, in ascending order of the lists, matching RESULT_SORTS:
+# note and date descending, then the film id the same way. Titles are sorted by
+# the collation of the database, which Python does not reproduce: that sort is
+# always read from the database.
+SORT_KEYS = {
+    "note": lambda film: (-(film["note"] or 0), -film["id"]),
+    "date": lambda film: (-(film["date"] or 0), -film["id"]),
+}
+CURSOR_KEYS = {
+    "note": lambda value, film_id: (-value, -film_id),
+    "date": lambda value, film_id: (-value, -film_id),
+}
+
+
+class ResultsView:
+    """
+    The films of a watchlist available on a set of providers, with only those
+    providers, in the order of a sort.
+    """
+
+    def __init__(self, films: list, sort: str):
+        self.films = sorted(films, key=SORT_KEYS[sort])
+        self.keys = [SORT_KEYS[sort](film) for film in self.films]
+        self.sort = sort
+        self._body = None
+
+    def select(
+        self,
+        limit: int = None,
+        after: tuple = None,
+        genre: str = None,
+        min_grade: float = None,
+        year_from: int = None,
+        year_to: int = None,
+    ) -> list:
+        """
+        Same films as get_user_results with these parameters.
+        """
+        start = bisect.bisect_right(self.keys, CURSOR_KEYS[self.sort](*after)) if after is not None else 0
+        if not genre and min_grade is None and year_from is None and year_to is None:
+            return self.films[start: start + limit if limit is not None else None]
+        films = []
+        for film in self.films[start:]:
+            if (
+                (not genre or genre in film["genres"])
+                and (min_grade is None or (film["note"] is not None and film["note"] >= min_grade))
+                and (year_from is None or (film["date"] is not None and film["date"] >= year_from))
+                and (year_to is None or (film["date"] is not None and film["date"] <= year_to))
+            ):
+                films.append(film)
+                if limit is not None and len(films) == limit:
+                    break
+        return films
+
+    def body(self) -> str:
+        """
+        All the films as a JSON array, serialized on first use.
+        """
+        if self._body is None:
+            self._body = json.dumps(self.films)
+        return self._body
+
+
+class WatchlistResults:
+    """
+    The films of a watchlist available in a country, with their providers encoded
+    as bitsets, and the views of the provider sets and sorts asked last.
+    """
+
+    def __init__(self, films: list):
+        self.bits = {}
+        self.films = films
+        self.masks = []
+        for film in films:
+            mask = 0
+            for provider in film["providers"]:
+                mask |= 1 << self.bits.setdefault(provider, len(self.bits))
+            self.masks.append(mask)
+        self._views = {}
+        self._lock = threading.Lock()
+
+    def view(self, providers: list, sort: str = "note") -> ResultsView:
+        """
+        Return the view of a provider set and sort, built on first use. Films
+        match when their bitset shares a bit with the one of the providers.
+        """
+        selected = 0
+        for provider in providers:
+            if provider in self.bits:
+                selected |= 1 << self.bits[provider]
+        with self._lock:
+            view = self._views.get((selected, sort))
+        if view is not None:
+            return view
+        view = ResultsView(
+            [
+                {**film, "providers": [provider for provider in film["providers"] if selected >> self.bits[provider] & 1]}
+                for film, mask in zip(self.films, self.masks)
+                if mask & selected
+            ],
+            sort,
+        )
+        with self._lock:
+            if len(self._views) >= VIEWS_PER_WATCHLIST:
+                self._views.pop(next(iter(self._views)))
+            self._views[(selected, sort)] = view
+        return view
+
+    def select(self, providers: list, sort: str = "note", **query) -> list:
+        """
+        Same results as get_user_results, from the view of providers and sort.
+        """
+        return self.view(providers, sort).select(**query)
+
+
+_cache = LRUCache(RESULTS_CACHE_SIZE)
+
+
+def get_watchlist_results(user_ID: int, country_code: str, version: int) -> WatchlistResults | None:
+    """
+    Return the cached results of a watchlist in a country at the given version,
+    loading them on a miss. Returns None if they could not be loaded.
+    """
+    key = (user_ID, country_code)
+    cached = _cache.get(key)
+    if cached is not None and cached[0] == version:
+        CACHE_LOOKUPS.labels("results", "hit").inc()
+        return cached[1]
+    CACHE_LOOKUPS.labels("results", "miss").inc()
+    films = get_user_films(user_ID, country_code)
+    if films is None:
+        return None
+    results = WatchlistResults(films)
+    _cache.set(key, (version, results), datetime.now() + RESULTS_CACHE_TTL)
+    return results
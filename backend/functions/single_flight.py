@@ -0,0 +1,68 @@
+import asyncio
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls within a process.
+    While a call for a key is running, other callers with the same key wait for it
+    and receive its result (or its exception) instead of running it again.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        """
+        Run func() unless a call for key is already running, and return its result.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+        else:
+            try:
+                call.result = func()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+
+class AsyncSingleFlight:
+    """
+    SingleFlight for coroutines of one event loop: concurrent awaits of the same
+    key share a single run of the coroutine.
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, func):
+        """
+        Await func() unless a call for key is already running, and return its result.
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = self._calls[key] = asyncio.ensure_future(func())
+            call.add_done_callback(lambda _: self._calls.pop(key, None))
+        # A cancelled waiter must not cancel the call shared with the others
+        return await asyncio.shield(call)
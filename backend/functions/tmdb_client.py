@@ -0,0 +1,156 @@
+import asyncio
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from functions.metrics import TMDB_REQUESTS
+from functions.rate_limit import TokenBucket
+
+# Responses worth retrying: throttling and transient server errors.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def _backoff(attempt: int, max_delay: float) -> float:
+    # Exponential backoff with jitter
+    return min(2 ** attempt * 0.5, max_delay) + random.uniform(0, 0.25)
+
+
+def _retry_after(response) -> float | None:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class TMDBClient:
+    """
+    HTTP client for The Movie Database API shared by every request of a process.
+    It keeps a pool of keep-alive connections, applies request timeouts, limits
+    the request rate on the client side, and retries throttled or failed calls
+    with a backoff that honours Retry-After.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        rate: float,
+        burst: float,
+        timeout: float,
+        max_retries: int,
+        max_retry_delay: float,
+        pool_size: int,
+    ):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_retry_delay = max_retry_delay
+        self.limiter = TokenBucket(rate, burst)
+        # Requests sent since the client was created, retries included
+        self.requests_sent = 0
+        self._count_lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        # Plain HTTP is only used by local stand-ins of the API
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "accept": "application/json",
+            "Authorization": f"Bearer {token}",
+        })
+
+    def get(self, url: str) -> requests.Response:
+        """
+        GET a TMDB URL. Returns the last response, which may still be an error
+        once the retries are exhausted. Raises the network error of the last
+        attempt if every attempt failed to connect.
+        """
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            with self._count_lock:
+                self.requests_sent += 1
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                TMDB_REQUESTS.labels("error").inc()
+                if attempt == self.max_retries:
+                    raise
+                delay = _backoff(attempt, self.max_retry_delay)
+                print(f"⚠️ TMDB request failed ({str(e)[:120]}), retrying in {delay:.1f}s", flush=True)
+            else:
+                TMDB_REQUESTS.labels(str(response.status_code)).inc()
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    return response
+                delay = _retry_after(response)
+                if delay is None:
+                    delay = _backoff(attempt, self.max_retry_delay)
+                print(f"⚠️ TMDB returned {response.status_code}, retrying in {delay:.1f}s", flush=True)
+            time.sleep(min(delay, self.max_retry_delay))
+
+
+class AsyncTMDBClient:
+    """
+    Asynchronous counterpart of TMDBClient for the builds run on an event loop.
+    It shares the rate limiter of the threaded client so that the process stays
+    within the same request rate, and behaves the same on errors. The httpx
+    client is created on first use, in the event loop that uses it.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        limiter: TokenBucket,
+        timeout: float,
+        max_retries: int,
+        max_retry_delay: float,
+        pool_size: int,
+    ):
+        self.token = token
+        self.limiter = limiter
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_retry_delay = max_retry_delay
+        self.pool_size = pool_size
+        self._client = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+                headers={"accept": "application/json", "Authorization": f"Bearer {self.token}"},
+            )
+        return self._client
+
+    async def get(self, url: str) -> httpx.Response:
+        """
+        GET a TMDB URL, see TMDBClient.get.
+        """
+        client = self._get_client()
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire_async()
+            try:
+                response = await client.get(url)
+            except httpx.TransportError as e:
+                TMDB_REQUESTS.labels("error").inc()
+                if attempt == self.max_retries:
+                    raise
+                delay = _backoff(attempt, self.max_retry_delay)
+                print(f"⚠️ TMDB request failed ({str(e)[:120]}), retrying in {delay:.1f}s", flush=True)
+            else:
+                TMDB_REQUESTS.labels(str(response.status_code)).inc()
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    return response
+                delay = _retry_after(response)
+                if delay is None:
+                    delay = _backoff(attempt, self.max_retry_delay)
+                print(f"⚠️ TMDB returned {response.status_code}, retrying in {delay:.1f}s", flush=True)
+            await asyncio.sleep(min(delay, self.max_retry_delay))
@@ -0,0 +1,44 @@
+import contextvars
+import logging
+import os
+import uuid
+
+# Log records carry the trace id of the request (or build job) they belong to.
+# With LOG_TRACE_IDS set, the backend logs go to stderr in a format showing it.
+LOG_TRACE_IDS = os.getenv("LOG_TRACE_IDS", "").lower() in ("1", "true", "yes")
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(trace_id)s] %(name)s: %(message)s"
+
+trace_id = contextvars.ContextVar("trace_id", default="-")
+
+
+class TraceIdFilter(logging.Filter):
+    """
+    Adds the current trace id to the log records as "trace_id".
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = trace_id.get()
+        return True
+
+
+def new_trace_id(incoming: str | None = None) -> str:
+    """
+    Start a trace for the current request, reusing a client-provided id if any.
+    """
+    value = (incoming or "").strip()[:64] or uuid.uuid4().hex[:16]
+    trace_id.set(value)
+    return value
+
+
+def configure_logging():
+    """
+    Log with trace ids when LOG_TRACE_IDS is set.
+    """
+    if not LOG_TRACE_IDS:
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handler.addFilter(TraceIdFilter())
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(logging.INFO)
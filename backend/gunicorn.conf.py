@@ -0,0 +1,31 @@
+import os
+import shutil
+
+# Samples of every worker are written to PROMETHEUS_MULTIPROC_DIR, see functions/metrics.py.
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# "wsgi": threaded workers serving the Flask app, builds run in JOB_WORKERS threads.
+# "asgi": uvicorn workers serving app/asgi.py, builds run as coroutines (ASYNC_BUILDS).
+SERVER_MODE = os.getenv("SERVER_MODE", "wsgi")
+
+if SERVER_MODE == "asgi":
+    wsgi_app = "app.asgi:app"
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    wsgi_app = "app.app:app"
+    worker_class = "gthread"
+    threads = int(os.getenv("GUNICORN_THREADS", "4"))
+
+
+def on_starting(server):
+    # Samples of a previous run would be added to the new ones
+    if PROMETHEUS_MULTIPROC_DIR:
+        shutil.rmtree(PROMETHEUS_MULTIPROC_DIR, ignore_errors=True)
+        os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if PROMETHEUS_MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,170 @@
+"""
+Background pre-warming of the watchlists about to expire.
+
+During off-peak hours, the scheduler rebuilds the results of the users who came
+recently and whose watchlist was last researched PREWARM_AFTER_DAYS ago, most
+frequent visitors first, for the country of their last visit. Their next visit
+is then answered from the stored results instead of waiting for a build.
+It runs as a process of its own, next to the backend:
+
+    python scheduler.py
+
+Builds go through the jobs of functions/job_functions.py, so they never overlap
+with a build queued by the backend for the same user.
+"""
+import os
+import time
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date, datetime, timedelta
+
+# The scheduler serves no metrics: its counters stay in memory instead of
+# being written to the directory of the backend workers.
+os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+
+from functions.db_functions import get_prewarm_candidates, warm_up_db_pool
+from functions.fetch_functions import tmdb_client
+from functions.job_functions import run_build
+from functions.tracing import configure_logging, new_trace_id
+
+logger = logging.getLogger(__name__)
+
+# Local hours during which watchlists are refreshed, as "start-end" (end
+# excluded, may wrap around midnight). Empty to refresh at any time.
+PREWARM_HOURS = os.getenv("PREWARM_HOURS", "2-6")
+# Builds run at the same time.
+PREWARM_CONCURRENCY = int(os.getenv("PREWARM_CONCURRENCY", "2"))
+# TMDB requests the scheduler may send per day, retries included. Builds in
+# flight when it is spent run to their end.
+PREWARM_DAILY_TMDB_BUDGET = int(os.getenv("PREWARM_DAILY_TMDB_BUDGET", "20000"))
+# Age of a watchlist from which it is refreshed, in days. The backend rebuilds
+# watchlists older than 7 days on the next visit.
+PREWARM_AFTER_DAYS = int(os.getenv("PREWARM_AFTER_DAYS", "6"))
+# Only users who came within this many days are refreshed.
+PREWARM_ACTIVE_DAYS = int(os.getenv("PREWARM_ACTIVE_DAYS", "30"))
+# Seconds between two scans of the users.
+PREWARM_INTERVAL_SECONDS = int(os.getenv("PREWARM_INTERVAL_SECONDS", "300"))
+
+
+def parse_hours(hours: str) -> tuple | None:
+    """
+    Parse PREWARM_HOURS into (start, end), or None for any time.
+    """
+    if not hours.strip():
+        return None
+    start, end = hours.split("-")
+    return int(start) % 24, int(end) % 24
+
+
+def is_off_peak(now: datetime, hours: tuple | None) -> bool:
+    if hours is None:
+        return True
+    start, end = hours
+    if start <= end:
+        return start <= now.hour < end
+    return now.hour >= start or now.hour < end
+
+
+class Scheduler:
+    """
+    Refreshes the stale watchlists of the most frequent visitors within a daily
+    budget of TMDB requests. Users are tried at most once a day, so that a
+    watchlist that cannot be built is not retried on every scan.
+    """
+
+    def __init__(self, concurrency: int, daily_budget: int, hours: tuple | None):
+        self.concurrency = concurrency
+        self.daily_budget = daily_budget
+        self.hours = hours
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="prewarm")
+        self._day = None
+        self._day_start = 0
+        self._tried = set()
+
+    def budget_left(self) -> int:
+        """
+        TMDB requests left for today.
+        """
+        return self.daily_budget - (tmdb_client.requests_sent - self._day_start)
+
+    def can_start(self) -> bool:
+        """
+        Whether a build may start now. The budget and the users tried start
+        again every day.
+        """
+        if self._day != date.today():
+            self._day = date.today()
+            self._day_start = tmdb_client.requests_sent
+            self._tried.clear()
+        return is_off_peak(datetime.now(), self.hours) and self.budget_left() > 0
+
+    def run_once(self) -> int:
+        """
+        Refresh the watchlists found stale by one scan of the users and return
+        the number of builds run. Stops early when off-peak hours or the budget
+        end; the builds in flight are awaited.
+        """
+        if not self.can_start():
+            return 0
+        now = datetime.now()
+        candidates = get_prewarm_candidates(
+            now - timedelta(days=PREWARM_AFTER_DAYS),
+            now - timedelta(days=PREWARM_ACTIVE_DAYS),
+            # Room for the users already tried today
+            self.concurrency * 4 + len(self._tried),
+        )
+        if not candidates:
+            return 0
+        running = set()
+        builds = 0
+        for user_ID, username, country_code in candidates:
+            if user_ID in self._tried:
+                continue
+            while len(running) >= self.concurrency:
+                _, running = wait(running, return_when=FIRST_COMPLETED)
+            if not self.can_start():
+                break
+            self._tried.add(user_ID)
+            running.add(self._executor.submit(self._build, user_ID, username, country_code))
+            builds += 1
+        wait(running)
+        return builds
+
+    def _build(self, user_ID: int, username: str, country_code: str):
+        new_trace_id()
+        started = time.monotonic()
+        try:
+            job_id = run_build(user_ID, username, country_code)
+        except Exception:
+            logger.exception("Pre-warming of %s failed", username)
+            return
+        if job_id is None:
+            logger.info("Pre-warming of %s skipped, a build is already running", username)
+        else:
+            logger.info(
+                "Pre-warmed %s (country=%s) in %.1fs, job %s, %s TMDB requests left today",
+                username, country_code, time.monotonic() - started, job_id, self.budget_left(),
+            )
+
+
+def main():
+    configure_logging()
+    warm_up_db_pool()
+    scheduler = Scheduler(PREWARM_CONCURRENCY, PREWARM_DAILY_TMDB_BUDGET, parse_hours(PREWARM_HOURS))
+    logger.info(
+        "Scheduler started (hours=%s, concurrency=%s, daily TMDB budget=%s)",
+        PREWARM_HOURS or "any", PREWARM_CONCURRENCY, PREWARM_DAILY_TMDB_BUDGET,
+    )
+    while True:
+        try:
+            builds = scheduler.run_once()
+        except Exception:
+            logger.exception("Pre-warming scan failed")
+            builds = 0
+        # Scan again right away while there may be more stale watchlists
+        if not builds:
+            time.sleep(PREWARM_INTERVAL_SECONDS)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import asyncio
+import threading
+import time
+from app.asgi import PooledWsgiToAsgi
+
+ROUTE_SECONDS = 0.5
+
+
+def slow_route(environ, start_response):
+    time.sleep(ROUTE_SECONDS)
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    return [threading.current_thread().name.encode()]
+
+
+async def get(app, path: str) -> list:
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": "GET",
+        "path": path,
+        "query_string": b"",
+        "headers": [],
+    }
+    await app(scope, receive, send)
+    return messages
+
+
+def test_slow_wsgi_routes_overlap():
+    app = PooledWsgiToAsgi(slow_route)
+
+    async def main():
+        return await asyncio.gather(get(app, "/results"), get(app, "/metrics"))
+
+    started = time.perf_counter()
+    responses = asyncio.run(main())
+    elapsed = time.perf_counter() - started
+
+    assert [messages[0]["status"] for messages in responses] == [200, 200]
+    threads = {b"".join(message.get("body", b"") for message in messages[1:]) for messages in responses}
+    assert len(threads) == 2
+    assert elapsed < 2 * ROUTE_SECONDS * 0.9
@@ -0,0 +1,49 @@
+import base64
+import json
+import pytest
+import app.app as backend
+from app.app import decode_cursor, encode_cursor
+
+COUNTRY_CODE = "FR"
+
+
+def make_cursor(*items) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(items)).encode()).decode()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(backend, "get_all_regions", lambda: {COUNTRY_CODE: "France"})
+    return backend.app.test_client()
+
+
+@pytest.mark.parametrize("sort", ["note", "date", "title"])
+def test_encoded_cursors_decode(sort):
+    film = {"id": 42, "title": "Alien", "note": 7.5, "date": 1979}
+    value = {"note": 7.5, "date": 1979, "title": "Alien"}[sort]
+    assert decode_cursor(encode_cursor(sort, film), sort) == (value, 42)
+
+
+@pytest.mark.parametrize(
+    "sort, cursor",
+    [
+        ("note", make_cursor("note", "x", None)),
+        ("note", make_cursor("note", 7.5, "42")),
+        ("note", make_cursor("note", True, 42)),
+        ("date", make_cursor("date", 1979, 4.2)),
+        ("date", make_cursor("date", None, 42)),
+        ("title", make_cursor("title", 3, 42)),
+        ("title", make_cursor("title", "Alien", False)),
+        ("note", make_cursor("note", 7.5)),
+        ("note", "not a cursor"),
+    ],
+)
+def test_wrongly_typed_cursors_are_rejected(client, sort, cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, sort)
+    response = client.post(
+        "/results",
+        json={"username": "__test_cursors", "country_code": COUNTRY_CODE, "sort": sort, "limit": 5, "cursor": cursor},
+    )
+    assert response.status_code == 400
+    assert "invalid cursor" in response.get_data(as_text=True)
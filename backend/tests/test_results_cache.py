@@ -0,0 +1,134 @@
+import base64
+import json
+import pytest
+import app.app as backend
+from app.app import decode_cursor, encode_cursor
+from functions.db_functions import db_operation, get_userID, modify_film
+from functions.results_cache import ResultsView
+
+USERNAME = "__test_results_cache"
+COUNTRY_CODE = "FR"
+PROVIDERS = ["Netflix", "Mubi"]
+# Ids far above the TMDB ones
+FILM_ID_OFFSET = 2_050_000_000
+TITLES = ["Zodiac", None, "amélie", "Amelie", "Élise", "alien", "Alien", "Ça", "eden", "Eden", "123", "_x", "Zoé"]
+
+
+def make_films() -> list:
+    films = []
+    for i, title in enumerate(TITLES):
+        films.append({
+            "key": f"test results cache {i}",
+            "id": FILM_ID_OFFSET + i,
+            "title": title,
+            # Ties and missing grades and dates
+            "note": None if i % 5 == 0 else float(i % 3),
+            "date": "" if i % 4 == 0 else str(1990 + i % 2),
+            "genres": ["Drama"],
+            "availability": {COUNTRY_CODE: {"flatrate": [PROVIDERS[i % 2]]}},
+        })
+    return films
+
+
+@db_operation(commit=True)
+def cleanup(cursor, user_ID: int):
+    ids = [FILM_ID_OFFSET + i for i in range(len(TITLES))]
+    cursor.execute('DELETE FROM "WATCHLIST" WHERE user_id = %s', (user_ID,))
+    cursor.execute('DELETE FROM "PROVIDER" WHERE user_id = %s', (user_ID,))
+    cursor.execute('DELETE FROM "USER" WHERE user_id = %s', (user_ID,))
+    cursor.execute('DELETE FROM "FILM_LOOKUP" WHERE film_id = ANY(%s)', (ids,))
+    cursor.execute('DELETE FROM "FILM_AVAILABILITY" WHERE film_id = ANY(%s)', (ids,))
+    cursor.execute('DELETE FROM "FILM" WHERE film_id = ANY(%s)', (ids,))
+    return True
+
+
+@pytest.fixture
+def client(monkeypatch):
+    user_ID = get_userID(USERNAME)
+    if user_ID is None:
+        pytest.skip("no Postgres database configured")
+    try:
+        assert modify_film(user_ID, make_films()) is not None
+        monkeypatch.setattr(backend, "get_all_regions", lambda: {COUNTRY_CODE: "France"})
+        yield backend.app.test_client()
+    finally:
+        cleanup(user_ID)
+
+
+def post_results(client, **body) -> dict:
+    response = client.post(
+        "/results", json={"username": USERNAME, "country_code": COUNTRY_CODE, "providers": PROVIDERS, **body}
+    )
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response.get_json()
+
+
+def pages(client, sort: str, limit: int) -> list:
+    ids = []
+    cursor = None
+    while True:
+        page = post_results(client, sort=sort, limit=limit, cursor=cursor)
+        ids.extend(film["id"] for film in page["results"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids
+
+
+@pytest.mark.parametrize("sort", ["note", "date", "title"])
+def test_cached_results_match_the_database(client, monkeypatch, sort):
+    monkeypatch.setattr(backend, "RESULTS_CACHE_SIZE", 0)
+    expected = [film["id"] for film in post_results(client, sort=sort)]
+    expected_pages = pages(client, sort, 5)
+    first_page = post_results(client, sort=sort, limit=5)
+
+    monkeypatch.setattr(backend, "RESULTS_CACHE_SIZE", 1024)
+    assert [film["id"] for film in post_results(client, sort=sort)] == expected
+    assert pages(client, sort, 5) == expected
+    assert expected_pages == expected
+    # A cursor issued without the cache continues the same list with it
+    second_page = post_results(client, sort=sort, limit=5, cursor=first_page["next_cursor"])
+    assert [film["id"] for film in second_page["results"]] == expected[5:10]
+
+
+@pytest.mark.parametrize("sort", ["note", "date"])
+def test_forged_cursors_are_rejected_by_the_cache(client, monkeypatch, sort):
+    monkeypatch.setattr(backend, "RESULTS_CACHE_SIZE", 1024)
+    post_results(client, sort=sort)
+    for forged in ([sort, "x", None], [sort, None, 1], [sort, 1.0, "1"], [sort, False, 1]):
+        cursor = base64.urlsafe_b64encode(json.dumps(forged).encode()).decode()
+        response = client.post(
+            "/results",
+            json={"username": USERNAME, "country_code": COUNTRY_CODE, "providers": PROVIDERS, "sort": sort, "cursor": cursor},
+        )
+        assert response.status_code == 400, forged
+
+
+@pytest.mark.parametrize("sort", ["note", "date"])
+def test_results_view_pages_follow_the_cursors(sort):
+    films = [
+        {
+            "id": i,
+            "title": f"Film {i}",
+            "note": None if i % 5 == 0 else float(i % 3),
+            "date": None if i % 4 == 0 else 1990 + i % 2,
+            "genres": ["Drama"] if i % 2 else ["Comedy"],
+            "providers": ["Netflix"],
+        }
+        for i in range(1, 14)
+    ]
+    view = ResultsView(films, sort)
+    expected = sorted(films, key=lambda film: (film[sort] or 0, film["id"]), reverse=True)
+    assert view.films == expected
+
+    ids = []
+    after = None
+    while True:
+        page = view.select(limit=4, after=after)
+        ids.extend(film["id"] for film in page)
+        if len(page) < 4:
+            break
+        after = decode_cursor(encode_cursor(sort, page[-1]), sort)
+    assert ids == [film["id"] for film in expected]
+
+    dramas = view.select(limit=2, after=decode_cursor(encode_cursor(sort, expected[0]), sort), genre="Drama")
+    assert dramas == [film for film in expected[1:] if "Drama" in film["genres"]][:2]
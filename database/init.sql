@@ -2,8 +2,13 @@ CREATE TABLE "USER" (
     user_id SERIAL PRIMARY KEY,
     letterboxd_username VARCHAR,
     created_at TIMESTAMP,
-    last_research TIMESTAMP
+    last_research TIMESTAMP,
+    results_version INT NOT NULL DEFAULT 0,
+    visit_count INT NOT NULL DEFAULT 0,
+    last_visit TIMESTAMP,
+    last_country_code VARCHAR
 );
+CREATE UNIQUE INDEX "USER_letterboxd_username_idx" ON "USER" (letterboxd_username) INCLUDE (user_id, last_research, results_version);
 CREATE TABLE "PROVIDER"(
     provider_name VARCHAR,
     country_code VARCHAR,
@@ -12,14 +17,57 @@ CREATE TABLE "PROVIDER"(
     FOREIGN KEY (user_id) REFERENCES "USER"(user_id)
 );
 CREATE TABLE "FILM"(
-    film_id INT,
+    film_id INT PRIMARY KEY,
     title VARCHAR,
     grade FLOAT,
-    providers VARCHAR,
     date INT,
+    genres TEXT[] NOT NULL DEFAULT '{}',
+    updated_at TIMESTAMP,
+    providers_updated_at TIMESTAMP
+);
+CREATE INDEX "FILM_genres_idx" ON "FILM" USING GIN (genres);
+CREATE INDEX "FILM_grade_idx" ON "FILM" ((COALESCE(grade, 0)) DESC, film_id DESC);
+CREATE INDEX "FILM_date_idx" ON "FILM" ((COALESCE(date, 0)) DESC, film_id DESC);
+CREATE INDEX "FILM_title_idx" ON "FILM" ((COALESCE(title, '')), film_id);
+CREATE TABLE "FILM_AVAILABILITY"(
+    film_id INT,
     country_code VARCHAR,
-    genres VARCHAR,
+    monetization_type VARCHAR,
+    providers TEXT[] NOT NULL DEFAULT '{}',
+    PRIMARY KEY (film_id, country_code, monetization_type),
+    FOREIGN KEY (film_id) REFERENCES "FILM"(film_id)
+);
+CREATE INDEX "FILM_AVAILABILITY_providers_idx" ON "FILM_AVAILABILITY" USING GIN (providers);
+CREATE TABLE "FILM_LOOKUP"(
+    lookup_key VARCHAR PRIMARY KEY,
+    film_id INT,
+    FOREIGN KEY (film_id) REFERENCES "FILM"(film_id)
+);
+CREATE INDEX "FILM_LOOKUP_film_id_idx" ON "FILM_LOOKUP" (film_id);
+CREATE TABLE "WATCHLIST"(
     user_id INT,
-    PRIMARY KEY (user_id, country_code, film_id),
-    FOREIGN KEY (user_id) REFERENCES "USER"(user_id)
-);
\ No newline at end of file
+    lookup_key VARCHAR,
+    PRIMARY KEY (user_id, lookup_key),
+    FOREIGN KEY (user_id) REFERENCES "USER"(user_id),
+    FOREIGN KEY (lookup_key) REFERENCES "FILM_LOOKUP"(lookup_key)
+);
+CREATE TABLE "TMDB_CACHE"(
+    url VARCHAR PRIMARY KEY,
+    payload VARCHAR,
+    expires_at TIMESTAMP
+);
+CREATE INDEX "TMDB_CACHE_expires_at_idx" ON "TMDB_CACHE" (expires_at);
+CREATE TABLE "JOB"(
+    job_id VARCHAR PRIMARY KEY,
+    username VARCHAR,
+    country_code VARCHAR,
+    status VARCHAR,
+    stage VARCHAR,
+    pages_scraped INT DEFAULT 0,
+    films_total INT DEFAULT 0,
+    films_enriched INT DEFAULT 0,
+    error VARCHAR,
+    created_at TIMESTAMP,
+    updated_at TIMESTAMP
+);
+CREATE UNIQUE INDEX "JOB_active_idx" ON "JOB" (username, country_code) WHERE status IN ('queued', 'running');
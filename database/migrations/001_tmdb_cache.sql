@@ -0,0 +1,7 @@
+-- Shared cache of The Movie Database API responses.
+CREATE TABLE IF NOT EXISTS "TMDB_CACHE"(
+    url VARCHAR PRIMARY KEY,
+    payload VARCHAR,
+    expires_at TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS "TMDB_CACHE_expires_at_idx" ON "TMDB_CACHE" (expires_at);
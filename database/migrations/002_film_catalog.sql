@@ -0,0 +1,33 @@
+-- Replace the per-user "FILM" table with a catalog shared by every user.
+-- The old rows only cached TMDB data, so they are dropped and every user
+-- is rebuilt on their next search.
+DROP TABLE IF EXISTS "FILM";
+CREATE TABLE "FILM"(
+    film_id INT PRIMARY KEY,
+    title VARCHAR,
+    grade FLOAT,
+    date INT,
+    genres VARCHAR,
+    updated_at TIMESTAMP
+);
+CREATE TABLE "FILM_AVAILABILITY"(
+    film_id INT,
+    country_code VARCHAR,
+    providers VARCHAR,
+    updated_at TIMESTAMP,
+    PRIMARY KEY (film_id, country_code),
+    FOREIGN KEY (film_id) REFERENCES "FILM"(film_id)
+);
+CREATE TABLE "FILM_LOOKUP"(
+    lookup_key VARCHAR PRIMARY KEY,
+    film_id INT,
+    FOREIGN KEY (film_id) REFERENCES "FILM"(film_id)
+);
+CREATE TABLE "WATCHLIST"(
+    user_id INT,
+    lookup_key VARCHAR,
+    PRIMARY KEY (user_id, lookup_key),
+    FOREIGN KEY (user_id) REFERENCES "USER"(user_id),
+    FOREIGN KEY (lookup_key) REFERENCES "FILM_LOOKUP"(lookup_key)
+);
+UPDATE "USER" SET last_research = NULL;
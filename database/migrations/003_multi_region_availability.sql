@@ -0,0 +1,8 @@
+-- Store the offers of every region and monetization type from a single
+-- watch/providers response. Providers are re-checked on the next search.
+TRUNCATE "FILM_AVAILABILITY";
+ALTER TABLE "FILM_AVAILABILITY" DROP CONSTRAINT "FILM_AVAILABILITY_pkey";
+ALTER TABLE "FILM_AVAILABILITY" DROP COLUMN updated_at;
+ALTER TABLE "FILM_AVAILABILITY" ADD COLUMN monetization_type VARCHAR NOT NULL;
+ALTER TABLE "FILM_AVAILABILITY" ADD PRIMARY KEY (film_id, country_code, monetization_type);
+ALTER TABLE "FILM" ADD COLUMN providers_updated_at TIMESTAMP;
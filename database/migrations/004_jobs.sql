@@ -0,0 +1,15 @@
+-- Background builds of /results, deduplicated per username and country.
+CREATE TABLE IF NOT EXISTS "JOB"(
+    job_id VARCHAR PRIMARY KEY,
+    username VARCHAR,
+    country_code VARCHAR,
+    status VARCHAR,
+    stage VARCHAR,
+    pages_scraped INT DEFAULT 0,
+    films_total INT DEFAULT 0,
+    films_enriched INT DEFAULT 0,
+    error VARCHAR,
+    created_at TIMESTAMP,
+    updated_at TIMESTAMP
+);
+CREATE UNIQUE INDEX IF NOT EXISTS "JOB_active_idx" ON "JOB" (username, country_code) WHERE status IN ('queued', 'running');
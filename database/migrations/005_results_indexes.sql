@@ -0,0 +1,12 @@
+-- Store genres as a text array so that /results filters them in SQL, and
+-- index the columns /results filters and sorts on.
+ALTER TABLE "FILM" ADD COLUMN genres_list TEXT[] NOT NULL DEFAULT '{}';
+UPDATE "FILM" SET genres_list = ARRAY(SELECT json_array_elements_text(genres::json))
+WHERE genres IS NOT NULL AND genres <> '';
+ALTER TABLE "FILM" DROP COLUMN genres;
+ALTER TABLE "FILM" RENAME COLUMN genres_list TO genres;
+CREATE INDEX "FILM_genres_idx" ON "FILM" USING GIN (genres);
+CREATE INDEX "FILM_grade_idx" ON "FILM" ((COALESCE(grade, 0)) DESC, film_id DESC);
+CREATE INDEX "FILM_date_idx" ON "FILM" ((COALESCE(date, 0)) DESC, film_id DESC);
+CREATE INDEX "FILM_title_idx" ON "FILM" (title, film_id);
+CREATE INDEX "FILM_LOOKUP_film_id_idx" ON "FILM_LOOKUP" (film_id);
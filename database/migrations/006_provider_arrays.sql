@@ -0,0 +1,8 @@
+-- Store the providers of each offer as a text array instead of JSON text, so
+-- that provider filters run in SQL on a GIN index.
+ALTER TABLE "FILM_AVAILABILITY" ADD COLUMN providers_list TEXT[] NOT NULL DEFAULT '{}';
+UPDATE "FILM_AVAILABILITY" SET providers_list = ARRAY(SELECT json_array_elements_text(providers::json))
+WHERE providers IS NOT NULL AND providers <> '';
+ALTER TABLE "FILM_AVAILABILITY" DROP COLUMN providers;
+ALTER TABLE "FILM_AVAILABILITY" RENAME COLUMN providers_list TO providers;
+CREATE INDEX "FILM_AVAILABILITY_providers_idx" ON "FILM_AVAILABILITY" USING GIN (providers);
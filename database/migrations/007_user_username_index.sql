@@ -0,0 +1,3 @@
+-- /results looks users up by Letterboxd username on every call; the index also
+-- carries the columns it reads so that the lookup is an index-only scan.
+CREATE INDEX "USER_letterboxd_username_idx" ON "USER" (letterboxd_username) INCLUDE (user_id, last_research);
@@ -0,0 +1,5 @@
+-- Version of the stored results of each user, bumped whenever its watchlist is
+-- saved, so that the backends know when their cached results are outdated.
+ALTER TABLE "USER" ADD COLUMN results_version INT NOT NULL DEFAULT 0;
+DROP INDEX "USER_letterboxd_username_idx";
+CREATE INDEX "USER_letterboxd_username_idx" ON "USER" (letterboxd_username) INCLUDE (user_id, last_research, results_version);
@@ -0,0 +1,5 @@
+-- Visits of each user, so that the scheduler refreshes the watchlists of the
+-- most frequent visitors before they expire, for the country they asked last.
+ALTER TABLE "USER" ADD COLUMN visit_count INT NOT NULL DEFAULT 0;
+ALTER TABLE "USER" ADD COLUMN last_visit TIMESTAMP;
+ALTER TABLE "USER" ADD COLUMN last_country_code VARCHAR;
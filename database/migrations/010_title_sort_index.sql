@@ -0,0 +1,4 @@
+-- /results sorts films without a title first, as an empty title, so that
+-- its cursors can point at them.
+DROP INDEX "FILM_title_idx";
+CREATE INDEX "FILM_title_idx" ON "FILM" ((COALESCE(title, '')), film_id);
@@ -0,0 +1,31 @@
+-- One user per Letterboxd username: two first requests for the same username
+-- could each create one. The duplicates are merged into the oldest user, which
+-- keeps their providers, watchlist entries and visits, then the index becomes
+-- unique so that users are created with INSERT ... ON CONFLICT.
+CREATE TEMPORARY TABLE user_duplicates AS
+SELECT user_id, MIN(user_id) OVER (PARTITION BY letterboxd_username) AS kept_id
+FROM "USER" WHERE letterboxd_username IS NOT NULL;
+DELETE FROM user_duplicates WHERE user_id = kept_id;
+
+INSERT INTO "PROVIDER" (provider_name, country_code, user_id)
+SELECT p.provider_name, p.country_code, d.kept_id FROM "PROVIDER" p JOIN user_duplicates d ON d.user_id = p.user_id
+ON CONFLICT DO NOTHING;
+INSERT INTO "WATCHLIST" (user_id, lookup_key)
+SELECT d.kept_id, w.lookup_key FROM "WATCHLIST" w JOIN user_duplicates d ON d.user_id = w.user_id
+ON CONFLICT DO NOTHING;
+UPDATE "USER" u SET
+    visit_count = u.visit_count + merged.visit_count,
+    last_visit = GREATEST(u.last_visit, merged.last_visit),
+    results_version = u.results_version + 1
+FROM (
+    SELECT d.kept_id, SUM(v.visit_count) AS visit_count, MAX(v.last_visit) AS last_visit
+    FROM user_duplicates d JOIN "USER" v ON v.user_id = d.user_id GROUP BY d.kept_id
+) merged
+WHERE u.user_id = merged.kept_id;
+DELETE FROM "PROVIDER" WHERE user_id IN (SELECT user_id FROM user_duplicates);
+DELETE FROM "WATCHLIST" WHERE user_id IN (SELECT user_id FROM user_duplicates);
+DELETE FROM "USER" WHERE user_id IN (SELECT user_id FROM user_duplicates);
+DROP TABLE user_duplicates;
+
+DROP INDEX "USER_letterboxd_username_idx";
+CREATE UNIQUE INDEX "USER_letterboxd_username_idx" ON "USER" (letterboxd_username) INCLUDE (user_id, last_research, results_version);
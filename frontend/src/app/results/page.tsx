@@ -5,38 +5,250 @@ import { ResultCard } from '@/app/components/ResultCard';
 import { useResearch } from '@/app/context/ResearchContext';
 import { useRouter } from 'next/navigation';
 import { Film } from '../types/Film';
+import { Job } from '../types/Job';
+import { ResultsPage } from '../types/ResultsPage';
+import { ResultsEvent } from '../types/ResultsEvent';
 import { API_BASE_URL } from '@/app/config/config';
 
+const JOB_POLL_INTERVAL_MS = 2000;
+const RESULTS_PAGE_SIZE = 50;
+
+const describeJob = (job: Job) => {
+    const user = job.username;
+    if (job.stage === "scraping") {
+        return `${user}: reading Letterboxd page ${job.pages_scraped + 1}...`;
+    }
+    if (job.stage === "providers") {
+        return `${user}: checking providers (${job.films_enriched}/${job.films_total})...`;
+    }
+    if (job.stage === "saving") {
+        return `${user}: saving results...`;
+    }
+    return `${user}: waiting for the build to start...`;
+};
+
+const waitForJob = async (jobId: string, onProgress: (message: string) => void) => {
+    for (;;) {
+        await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+        const response = await fetch(`${API_BASE_URL}/results/jobs/${jobId}`);
+        if (!response.ok) {
+            throw new Error(`HTTP error! Status: ${response.status}`);
+        }
+        const job: Job = await response.json();
+        if (job.status === "failed") {
+            throw new Error(job.error || "Failed to load results. Please try again.");
+        }
+        if (job.status === "done") {
+            return;
+        }
+        onProgress(describeJob(job));
+    }
+};
+
+// Follow a build through /results/stream, receiving its films as they are found
+const followJob = async (
+    job: Job,
+    body: object,
+    onProgress: (message: string) => void,
+    onFilm: (film: Film) => void,
+) => {
+    const response = await fetch(`${API_BASE_URL}/results/stream`, {
+        method: "POST",
+        headers: {
+            "Content-Type": "application/json",
+        },
+        body: JSON.stringify(body),
+    });
+    if (response.status === 202) {
+        // The server follows too many builds already: poll this one instead
+        const polled: Job = await response.json();
+        await waitForJob(polled.job_id, onProgress);
+        return;
+    }
+    if (!response.ok || !response.body) {
+        throw new Error(`HTTP error! Status: ${response.status}`);
+    }
+    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+    let buffer = "";
+    for (;;) {
+        const { value, done } = await reader.read();
+        if (done) {
+            return;
+        }
+        buffer += value;
+        const lines = buffer.split("\n");
+        buffer = lines.pop() ?? "";
+        for (const line of lines) {
+            if (!line.trim()) {
+                continue;
+            }
+            const event: ResultsEvent = JSON.parse(line);
+            if (event.type === "film") {
+                onFilm(event.film);
+            } else if (event.type === "progress") {
+                onProgress(describeJob({ ...job, ...event }));
+            } else if (event.type === "error") {
+                throw new Error(event.error);
+            }
+        }
+    }
+};
+
+// POST to a results endpoint, waiting for the background builds it asks for.
+// body receives the ids of the builds already waited for. With onFilm, builds
+// are followed through the results stream instead of being polled, unless the
+// server has no stream left for them.
+const postResults = async (
+    path: string,
+    body: (jobIds: string[]) => object,
+    onProgress: (message: string) => void,
+    onFilm?: (film: Film) => void,
+): Promise<unknown> => {
+    const jobIds: string[] = [];
+    for (;;) {
+        const response = await fetch(`${API_BASE_URL}${path}`, {
+            method: "POST",
+            headers: {
+                "Content-Type": "application/json",
+            },
+            body: JSON.stringify(body(jobIds)),
+        });
+        if (response.status === 202) {
+            // The watchlist is being built in the background
+            const job: Job = await response.json();
+            onProgress(describeJob(job));
+            if (onFilm) {
+                await followJob(job, body([...jobIds, job.job_id]), onProgress, onFilm);
+            } else {
+                await waitForJob(job.job_id, onProgress);
+            }
+            jobIds.push(job.job_id);
+            continue;
+        }
+        if (!response.ok) {
+            let message = `HTTP error! Status: ${response.status}`;
+            try {
+                const payload = await response.json();
+                if (payload?.error && typeof payload.error === "string") {
+                    message = payload.error;
+                }
+            } catch {
+                // ignore JSON parsing errors
+            }
+            throw new Error(message);
+        }
+        return response.json();
+    }
+};
+
+interface ResultsPageQuery {
+    username: string;
+    countryCode: string;
+    providers: string[];
+    refresh: boolean;
+    dualMode: boolean;
+    genre: string;
+    cursor?: string | null;
+}
+
+// One page of the results of a user, filtered and sorted by the backend
+const fetchResultsPage = async (
+    query: ResultsPageQuery,
+    onProgress: (message: string) => void,
+    onFilm?: (film: Film) => void,
+): Promise<ResultsPage> => {
+    const data = await postResults(
+        "/results",
+        (jobIds) => ({
+            username: query.username,
+            country_code: query.countryCode,
+            providers: query.providers,
+            refresh: query.refresh,
+            dual_mode: query.dualMode,
+            job_id: jobIds[jobIds.length - 1],
+            limit: RESULTS_PAGE_SIZE,
+            cursor: query.cursor ?? undefined,
+            sort: "note",
+            genre: query.genre === "all" ? undefined : query.genre,
+        }),
+        onProgress,
+        onFilm,
+    );
+    const page = data as ResultsPage;
+    if (!page || !Array.isArray(page.results)) {
+        throw new Error("Invalid results data received");
+    }
+    return page;
+};
+
+const sortByNote = (films: Film[]) => [...films].sort((a: Film, b: Film) => b.note - a.note);
+
+const filterByGenre = (films: Film[], genre: string) =>
+    genre === "all" ? films : films.filter((film) => film.genres.includes(genre));
+
 export default function Result() {
     const { username, username2, dualMode, countryCode, yourProviders, refresh } = useResearch();
     const [results, setResults] = useState<Film[]>([]);
     const [resultsCommon, setResultsCommon] = useState<Film[]>([]);
-    const [resultsUser1, setResultsUser1] = useState<Film[]>([]);
-    const [resultsUser2, setResultsUser2] = useState<Film[]>([]);
-    const [sortedResults, setSortedResults] = useState<Film[]>([]);
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
+    const [genre, setGenre] = useState<string>("all");
     const [genres, setGenres] = useState<string[]>([]);
     const [loading, setLoading] = useState(false);
+    const [loadingMore, setLoadingMore] = useState(false);
+    // Films of a running build are shown while it goes on
+    const [building, setBuilding] = useState(false);
     const [error, setError] = useState<string>("");
+    const [progress, setProgress] = useState<string>("");
     const [sidebarView, setSidebarView] = useState<"common" | "user1" | "user2">("common");
     const routeur = useRouter();
 
-    const intersectResults = (a: Film[], b: Film[]) => {
-        const byKey = new Map<string, Film>();
-        a.forEach((film) => {
-            const key = `${film.title}__${film.date ?? ""}`;
-            byKey.set(key, film);
-        });
-        const common: Film[] = [];
-        b.forEach((film) => {
-            const key = `${film.title}__${film.date ?? ""}`;
-            const match = byKey.get(key);
-            if (match) {
-                const providers = (match.providers || []).filter((p) => (film.providers || []).includes(p));
-                const note = match.note >= film.note ? match.note : film.note;
-                common.push({ ...match, providers, note });
-            }
-        });
-        return common;
+    const showError = (err: unknown) => {
+        console.error("Error fetching watchlist providers:", err);
+        setError(err instanceof Error ? err.message : "Failed to load results. Please try again.");
+    };
+
+    // The first load has already refreshed the watchlists, later pages never do
+    const pageQuery = (view: "common" | "user1" | "user2", selectedGenre: string, cursor?: string | null) => ({
+        username: view === "user2" ? username2 : username,
+        countryCode,
+        providers: yourProviders,
+        refresh: false,
+        dualMode,
+        genre: selectedGenre,
+        cursor,
+    });
+
+    const showFirstPage = async (view: "common" | "user1" | "user2", selectedGenre: string) => {
+        if (view === "common") {
+            setResults(filterByGenre(resultsCommon, selectedGenre));
+            setNextCursor(null);
+            return;
+        }
+        setLoading(true);
+        setProgress("");
+        try {
+            const page = await fetchResultsPage(pageQuery(view, selectedGenre), setProgress);
+            setResults(page.results);
+            setNextCursor(page.next_cursor);
+        } catch (err) {
+            showError(err);
+        }
+        setLoading(false);
+    };
+
+    const loadMore = async () => {
+        if (!nextCursor) {
+            return;
+        }
+        setLoadingMore(true);
+        try {
+            const page = await fetchResultsPage(pageQuery(sidebarView, genre, nextCursor), setProgress);
+            setResults((previous) => [...previous, ...page.results]);
+            setNextCursor(page.next_cursor);
+        } catch (err) {
+            showError(err);
+        }
+        setLoadingMore(false);
     };
 
     useEffect(() => {
@@ -74,65 +286,58 @@ export default function Result() {
                 setError("Failed to load genres. Please try again.");
             });
 
-        const fetchResults = async (user: string) => {
-            const response = await fetch(`${API_BASE_URL}/results`, {
-                method: "POST",
-                headers: {
-                    "Content-Type": "application/json",
-                },
-                body: JSON.stringify({
-                    username: user,
-                    country_code: countryCode,
-                    providers: yourProviders,
-                    refresh: refresh,
-                    dual_mode: dualMode,
-                }),
-            });
-            if (!response.ok) {
-                let message = `HTTP error! Status: ${response.status}`;
-                try {
-                    const body = await response.json();
-                    if (body?.error && typeof body.error === "string") {
-                        message = body.error;
-                    }
-                } catch {
-                    // ignore JSON parsing errors
-                }
-                throw new Error(message);
-            }
-            const data = await response.json();
-            if (!Array.isArray(data)) {
-                throw new Error("Invalid results data received");
-            }
-            return data as Film[];
-        };
-
         const load = async () => {
             try {
+                setGenre("all");
+                setResults([]);
                 if (dualMode && username2) {
-                    const [data1, data2] = await Promise.all([fetchResults(username), fetchResults(username2)]);
-                    const sorted1 = [...data1].sort((a: Film, b: Film) => b.note - a.note);
-                    const sorted2 = [...data2].sort((a: Film, b: Film) => b.note - a.note);
-                    const common = intersectResults(sorted1, sorted2).sort((a: Film, b: Film) => b.note - a.note);
-                    setResultsUser1(sorted1);
-                    setResultsUser2(sorted2);
-                    setResultsCommon(common);
-                    setResults(common);
-                    setSortedResults(common);
+                    // The overlap is computed by the backend
+                    const data = await postResults(
+                        "/results/common",
+                        (jobIds) => ({
+                            usernames: [username, username2],
+                            country_code: countryCode,
+                            providers: yourProviders,
+                            refresh: refresh,
+                            job_ids: jobIds,
+                        }),
+                        setProgress,
+                    );
+                    if (!Array.isArray(data)) {
+                        throw new Error("Invalid results data received");
+                    }
+                    setResultsCommon(data as Film[]);
+                    setResults(data as Film[]);
+                    setNextCursor(null);
                     setSidebarView("common");
                 } else {
-                    const data = await fetchResults(username);
-                    const sortedData = [...data].sort((a: Film, b: Film) => b.note - a.note);
-                    setResults(sortedData);
-                    setSortedResults(sortedData);
-                    setResultsUser1(sortedData);
-                    setResultsUser2([]);
+                    const page = await fetchResultsPage(
+                        {
+                            username,
+                            countryCode,
+                            providers: yourProviders,
+                            refresh,
+                            dualMode: false,
+                            genre: "all",
+                        },
+                        setProgress,
+                        (film) => {
+                            setBuilding(true);
+                            setLoading(false);
+                            setResults((previous) => sortByNote([...previous, film]));
+                        },
+                    );
+                    setBuilding(false);
+                    setResults(page.results);
+                    setNextCursor(page.next_cursor);
                     setResultsCommon([]);
+                    setSidebarView("user1");
                 }
                 setLoading(false);
             } catch (err) {
                 console.error("Error fetching watchlist providers:", err);
                 setError(err instanceof Error ? err.message : "Failed to load results. Please try again.");
+                setBuilding(false);
                 setLoading(false);
             }
         };
@@ -158,15 +363,10 @@ export default function Result() {
                                                 id="sort"
                                                 className="bg-white dark:bg-gray-700 border border-gray-300 dark:border-gray-600 text-gray-900 dark:text-gray-200 rounded-md shadow-sm focus:ring-indigo-500 focus:border-indigo-500 p-2"
                                                 onChange={(e) => {
-                                                    const selectedGenre = e.target.value;
-                                                    if (selectedGenre === "all") {
-                                                        setSortedResults(results);
-                                                    } else {
-                                                        const filteredResults = results.filter((film) => film.genres.includes(selectedGenre));
-                                                        setSortedResults(filteredResults);
-                                                    }
+                                                    setGenre(e.target.value);
+                                                    showFirstPage(sidebarView, e.target.value);
                                                 }}
-                                                defaultValue="all"
+                                                value={genre}
                                             >
                                                 <option value="all">All Genres</option>
                                                 {genres.map((genre) => (
@@ -188,16 +388,7 @@ export default function Result() {
                                                     onChange={(e) => {
                                                         const value = e.target.value as "common" | "user1" | "user2";
                                                         setSidebarView(value);
-                                                        if (value === "common") {
-                                                            setResults(resultsCommon);
-                                                            setSortedResults(resultsCommon);
-                                                        } else if (value === "user1") {
-                                                            setResults(resultsUser1);
-                                                            setSortedResults(resultsUser1);
-                                                        } else {
-                                                            setResults(resultsUser2);
-                                                            setSortedResults(resultsUser2);
-                                                        }
+                                                        showFirstPage(value, genre);
                                                     }}
                                                 >
                                                     <option value="common">Common</option>
@@ -207,9 +398,23 @@ export default function Result() {
                                             </div>
                                         ) : null}
                                     </div>
+                                    {building ? (
+                                        <p className="mb-4 text-center text-sm text-gray-400 dark:text-gray-500">{progress}</p>
+                                    ) : null}
                                     {results && results.length > 0 ? (
                                         <>
-                                            <ResultCard films={sortedResults} />
+                                            <ResultCard films={results} />
+                                            {nextCursor ? (
+                                                <div className="mt-6 text-center">
+                                                    <button
+                                                        className="px-6 py-3 bg-indigo-600 hover:bg-indigo-700 text-white dark:bg-indigo-700 dark:hover:bg-indigo-600 rounded-md shadow-sm disabled:opacity-50"
+                                                        onClick={loadMore}
+                                                        disabled={loadingMore}
+                                                    >
+                                                        {loadingMore ? "Loading..." : "Load more"}
+                                                    </button>
+                                                </div>
+                                            ) : null}
                                         </>
                                     ) : (
                                         <div className="col-span-full text-center py-12">
@@ -228,7 +433,7 @@ export default function Result() {
                             <div className="col-span-full flex flex-col items-center justify-center py-12">
                                 <div className="animate-spin rounded-full h-12 w-12 border-t-2 border-b-2 border-indigo-500 mb-3"></div>
                                 <p className="text-lg text-gray-600 dark:text-gray-300">Loading providers...</p>
-                                <p className="text-sm text-gray-400 dark:text-gray-500">This can take up to 2 minutes</p>
+                                <p className="text-sm text-gray-400 dark:text-gray-500">{progress || "This can take up to 2 minutes"}</p>
                             </div>
                         </>
                     }
@@ -0,0 +1,10 @@
+export interface Job {
+    job_id: string;
+    username: string;
+    status: "queued" | "running" | "done" | "failed";
+    stage: "scraping" | "providers" | "saving" | null;
+    pages_scraped: number;
+    films_total: number;
+    films_enriched: number;
+    error: string | null;
+}
\ No newline at end of file
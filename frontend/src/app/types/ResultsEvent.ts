@@ -0,0 +1,10 @@
+import { Film } from "./Film";
+import { Job } from "./Job";
+
+export type ResultsEvent =
+    | ({ type: "job" } & Job)
+    | ({ type: "progress" } & Partial<Job>)
+    | { type: "film"; film: Film }
+    | { type: "error"; error: string }
+    | { type: "done"; count: number }
+    | { type: "heartbeat" };
\ No newline at end of file
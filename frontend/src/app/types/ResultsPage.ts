@@ -0,0 +1,6 @@
+import { Film } from "./Film";
+
+export interface ResultsPage {
+    results: Film[];
+    next_cursor: string | null;
+}
\ No newline at end of file